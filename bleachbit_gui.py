@@ -29,8 +29,11 @@ FIXME:
 """
 
 # standard library imports
+import fnmatch
 import os
 import random
+import re
+import sqlite3
 import time
 import threading
 
@@ -40,7 +43,20 @@ os.environ["PANGOCAIRO_BACKEND"] = "fc"
 # third-party imports
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GObject  # nopep8
+from gi.repository import Gtk, Gdk, GLib, GObject  # nopep8
+
+# local imports
+import chaff  # nopep8
+import inotify_watcher  # nopep8
+import preferences  # nopep8
+import privileged_helper  # nopep8
+import size_estimate  # nopep8
+import throttle  # nopep8
+from results_query import QueryError, compile_query  # nopep8
+from results_spill import INSERT_BATCH_SIZE, PAGE_SIZE, SpillStore, below_where  # nopep8
+from results_table import RangeSelection, ResultsTable  # nopep8
+from scan_cache import DirectoryScanCache  # nopep8
+from skip_list import SkipList  # nopep8
 
 cleaner_data = {
     "Chrome": {
@@ -69,6 +85,26 @@ cleaner_data = {
 }
 
 
+def option_location(path_template):
+    """Return (root directory, compiled pattern) for a path in cleaner_data
+
+    The root is the deepest directory above the first placeholder. Each
+    placeholder matches any text, including a slash, so the pattern matches
+    files at any depth below the root.
+    """
+    path = os.path.expanduser(path_template)
+    root = os.path.dirname(path.split("{", 1)[0])
+    pattern = re.sub(r"\{\w+\}", "*", path)
+    return root, re.compile(fnmatch.translate(pattern))
+
+
+# Time allowed for estimating all the selected options, in seconds.
+ESTIMATE_SECONDS = 1.5
+
+# Update more rows than this with the results TreeView detached.
+BULK_UPDATE_ROWS = 1000
+
+
 def format_file_size(size):
     if size < 1024:
         return f"{size} B"
@@ -84,10 +120,21 @@ def format_file_size(size):
         return f"{size / 1024 ** 5:.2f} PB"
 
 
+def format_estimate(estimate):
+    """Format a size_estimate.Estimate for the options pane"""
+    if estimate.exact:
+        return format_file_size(estimate.bytes)
+    if estimate.bound is None:
+        return f"> {format_file_size(estimate.bytes)}"
+    return f"~{format_file_size(estimate.bytes)} ± {format_file_size(estimate.bound)}"
+
+
 class BleachBitWindow(Gtk.Window):
     def __init__(self):
         super().__init__(title="Prototype of Next-Generation GUI for BleachBit")
         self.set_default_size(1000, 400)
+        self.preferences = preferences.load_preferences()
+        self.skip_list = SkipList()
 
         # Create a vertical box to hold the menubar, toolbar, and panes.
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
@@ -102,6 +149,7 @@ class BleachBitWindow(Gtk.Window):
         vbox.pack_start(self.paned, True, True, 0)
         self.create_options_pane(self.paned)
         self.create_wipe_free_space_pane()
+        self.create_chaff_pane()
         self.create_file_results_pane()
         self.show_right_pane(self.file_results_vbox)
 
@@ -112,8 +160,32 @@ class BleachBitWindow(Gtk.Window):
         # Coordinate the abort button
         self.abort_event = threading.Event()
 
+        # Remember directory listings so a repeated preview only lists
+        # directories that changed.
+        self.scan_cache = DirectoryScanCache()
+        self.preview_locations = []
+        self.preview_classes = {}
+        self.result_iters = {}
+        self.results_live = False
+        self.watcher = None
+        self.helper = None
+        if inotify_watcher.is_available():
+            self.watcher = inotify_watcher.InotifyWatcher(self.on_watched_path_changed)
+            self.watcher.start()
+
         # Gracefully close any background threads.
-        self.connect("destroy", lambda widget: self.abort_event.set())
+        self.connect("destroy", self.on_destroy)
+
+    def on_destroy(self, widget):
+        """Stop background threads and keep the scan cache for next time"""
+        self.abort_event.set()
+        if self.watcher:
+            self.watcher.stop()
+        if self.results_spill:
+            self.results_spill.close()
+        if self.helper:
+            self.helper.close()
+        self.scan_cache.save()
 
     def create_menubar(self, vbox):
         """Create a menu bar"""
@@ -124,11 +196,11 @@ class BleachBitWindow(Gtk.Window):
                 ("Shred file", None),
                 ("Shred folder", None),
                 ("Wipe free space", None),
-                ("Make chaff", None),
+                ("Make chaff", self.on_make_chaff_activated),
                 ("Quit", None),
             ]),
             ("Edit", [
-                ("Preferences", None)
+                ("Preferences", self.on_preferences_activated)
             ]),
             ("Help", [
                 ("System information", None),
@@ -168,7 +240,7 @@ class BleachBitWindow(Gtk.Window):
         vbox.pack_start(self.search_entry, False, False, 0)
 
         # Create a TreeView to display the available cleaning options
-        self.treestore_options = Gtk.TreeStore(str, bool)
+        self.treestore_options = Gtk.TreeStore(str, bool, str)
         self.treeview_options = Gtk.TreeView(model=self.treestore_options)
         self.option_filter = self.treestore_options.filter_new()
         self.option_filter.set_visible_func(self.on_options_search_changed_filter)
@@ -190,6 +262,10 @@ class BleachBitWindow(Gtk.Window):
         selected_column.add_attribute(selected_renderer, "active", 1)
         self.treeview_options.append_column(selected_column)
 
+        size_renderer = Gtk.CellRendererText()
+        size_column = Gtk.TreeViewColumn("Size", size_renderer, text=2)
+        self.treeview_options.append_column(size_column)
+
         # Add some sample data
         self.populate_options_pane()
 
@@ -269,9 +345,9 @@ class BleachBitWindow(Gtk.Window):
         This is example data for demonstration.
         """
         for parent, children in cleaner_data.items():
-            parent_iter = self.treestore_options.append(None, [parent, True])
+            parent_iter = self.treestore_options.append(None, [parent, True, ""])
             for child in children:
-                self.treestore_options.append(parent_iter, [child, True])
+                self.treestore_options.append(parent_iter, [child, True, ""])
 
     def create_toolbar(self, vbox):
         """Create the main toolbar with buttons"""
@@ -284,30 +360,38 @@ class BleachBitWindow(Gtk.Window):
             target=self.clean_files_worker, args=(False,)).start())
         toolbar.insert(self.preview_button, 0)
 
+        self.estimate_button = Gtk.ToolButton(
+            stock_id=Gtk.STOCK_FIND, label="Estimate")
+        self.estimate_button.set_tooltip_text(
+            "Quickly estimate how much space each selected option would free.")
+        self.estimate_button.connect("clicked", lambda widget: threading.Thread(
+            target=self.estimate_worker).start())
+        toolbar.insert(self.estimate_button, 1)
+
         self.clean_button = Gtk.ToolButton(stock_id=Gtk.STOCK_CLEAR, label="Clean")
         self.clean_button.connect("clicked", lambda widget: threading.Thread(
             target=self.clean_files_worker, args=(True,)).start())
-        toolbar.insert(self.clean_button, 1)
+        toolbar.insert(self.clean_button, 2)
 
         self.abort_button = Gtk.ToolButton(
             stock_id=Gtk.STOCK_STOP, label="Abort")
         self.abort_button.set_sensitive(False)
         self.abort_button.connect("clicked", lambda widget: self.abort_event.set())
-        toolbar.insert(self.abort_button, 2)
+        toolbar.insert(self.abort_button, 3)
 
         self.skip_list_button = Gtk.ToolButton(
             stock_id=Gtk.STOCK_ADD, label="Skip file")
         self.skip_list_button.connect("clicked", self.on_skip_file_clicked)
         self.skip_list_button.set_tooltip_text(
             "Always skip the selected files, so they are never cleaned.")
-        toolbar.insert(self.skip_list_button, 3)
+        toolbar.insert(self.skip_list_button, 4)
         self.skip_list_button.set_sensitive(False)
 
         self.wipe_free_space_button = Gtk.ToolButton(
             stock_id=Gtk.STOCK_DELETE, label="Wipe free space")
         self.wipe_free_space_button.connect("clicked", lambda widget: threading.Thread(
             target=self.wipe_free_space_worker).start())
-        toolbar.insert(self.wipe_free_space_button, 4)
+        toolbar.insert(self.wipe_free_space_button, 5)
 
         vbox.pack_start(toolbar, False, False, 0)
 
@@ -329,6 +413,9 @@ class BleachBitWindow(Gtk.Window):
         # Create a search box
         search_entry = Gtk.SearchEntry(width_chars=100)
         search_entry.set_placeholder_text("Search")
+        search_entry.set_tooltip_text(
+            "Search the cleaner, option and path, or use terms such as "
+            "cleaner:firefox path:*.log size>1GB action:error -cache")
         search_entry.connect("changed", self.on_results_search_changed)
         self.file_results_vbox.pack_start(search_entry, False, False, 0)
 
@@ -339,37 +426,83 @@ class BleachBitWindow(Gtk.Window):
         file_results_scrolled.add(self.results_treeview)
         self.file_results_vbox.pack_start(file_results_scrolled, True, True, 0)
 
-        # Create a ListStore to hold the data
-        self.results_liststore = Gtk.ListStore(str, str, str, int, str)
-        self.results_treeview.set_model(self.results_liststore)
+        # Page through results that were moved to disk. This is hidden
+        # until the results outgrow the memory budget.
+        self.results_spill = None
+        self.results_page_offset = 0
+        self.results_page_keys = []
+        self.results_page_generation = 0
+        self.results_page_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.results_page_box.set_no_show_all(True)
+        self.previous_page_button = Gtk.Button.new_with_label("Previous page")
+        self.previous_page_button.connect("clicked", lambda widget: self.load_results_page("previous"))
+        self.results_page_box.pack_start(self.previous_page_button, False, False, 0)
+        self.results_page_label = Gtk.Label(label="")
+        self.results_page_box.pack_start(self.results_page_label, True, True, 0)
+        self.next_page_button = Gtk.Button.new_with_label("Next page")
+        self.next_page_button.connect("clicked", lambda widget: self.load_results_page("next"))
+        self.results_page_box.pack_start(self.next_page_button, False, False, 0)
+        for child in self.results_page_box.get_children():
+            child.show()
+        self.file_results_vbox.pack_start(self.results_page_box, False, False, 0)
+
+        # Show the effective rate while cleaning in low-impact mode.
+        self.results_throttle = None
+        self.results_rate_label = Gtk.Label(label="", xalign=0)
+        self.results_rate_label.set_no_show_all(True)
+        self.file_results_vbox.pack_start(self.results_rate_label, False, False, 0)
+
+        # Create a ListStore to hold the data, with a column-oriented copy
+        # in results_table for sorting and searching. The last column says
+        # whether the row matches the search.
+        self.results_liststore = Gtk.ListStore(str, str, str, GObject.TYPE_INT64, str, bool)
+        self.results_table = ResultsTable()
+        self.results_working = False
+        # Counts clears of the results, so rows queued for the ListStore
+        # before a clear are dropped.
+        self.results_generation = 0
+        self.results_sort = None
+        self.results_query = compile_query("")
+        self.results_liststore_filter = self.results_liststore.filter_new()
+        self.results_liststore_filter.set_visible_column(5)
+        self.results_treeview.set_model(self.results_liststore_filter)
 
         # Create columns: cleaner, option, filename, file size, action.
         renderer = Gtk.CellRendererText()
         column = Gtk.TreeViewColumn("Cleaner", renderer, text=0)
-        column.set_sort_column_id(0)
         self.results_treeview.append_column(column)
 
         column = Gtk.TreeViewColumn("Option", renderer, text=1)
-        column.set_sort_column_id(1)
         self.results_treeview.append_column(column)
 
         column = Gtk.TreeViewColumn("Filename", renderer, text=2)
-        column.set_sort_column_id(2)
         self.results_treeview.append_column(column)
 
         column = Gtk.TreeViewColumn("File size (B)", renderer, text=3)
-        column.set_sort_column_id(3)
         column.set_cell_data_func(renderer, lambda column, cell, model, iter,
                                   data: cell.set_property('text', format_file_size(model.get_value(iter, 3))))
         self.results_treeview.append_column(column)
 
         column = Gtk.TreeViewColumn("Action", renderer, text=4)
-        column.set_sort_column_id(4)
         self.results_treeview.append_column(column)
 
+        # Sort on precomputed keys instead of through a Gtk.TreeModelSort,
+        # which compares rows one pair at a time.
+        for column_id, column in enumerate(self.results_treeview.get_columns()):
+            column.set_clickable(True)
+            column.connect("clicked", self.on_results_column_clicked, column_id)
+
         # Allow user to select multple rows for whitelisting.
         self.results_treeview.get_selection().set_mode(Gtk.SelectionMode.MULTIPLE)
 
+        # Follow clicks and select all as ranges of positions, so acting on
+        # a huge selection does not need a TreePath per row.
+        self.results_selection = RangeSelection()
+        self.results_treeview.connect("button-press-event", self.on_results_button_press)
+        self.results_treeview.connect("select-all", self.on_results_select_all)
+        self.results_treeview.connect("unselect-all", self.on_results_unselect_all)
+        self.results_selection_tracking = False
+
         # Add a context menu.
         self.results_treeview.connect("button-press-event",
                                       self.on_file_result_context_menu)
@@ -405,6 +538,18 @@ class BleachBitWindow(Gtk.Window):
         self.wipe_free_scrolled = Gtk.ScrolledWindow()
         self.wipe_free_scrolled.add(self.wipe_free_space_treeview)
 
+    def create_chaff_pane(self):
+        """Create a pane for the progress of making chaff
+
+        This function creates a widget without displaying it.
+        """
+        self.chaff_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        self.chaff_label = Gtk.Label(label="")
+        self.chaff_label.set_xalign(0)
+        self.chaff_vbox.pack_start(self.chaff_label, False, False, 0)
+        self.chaff_progressbar = Gtk.ProgressBar(show_text=True)
+        self.chaff_vbox.pack_start(self.chaff_progressbar, False, False, 0)
+
     def show_right_pane(self, right_pane_widget):
         assert hasattr(self, "wipe_free_scrolled")
         right_pane = self.paned.get_child2()
@@ -416,34 +561,377 @@ class BleachBitWindow(Gtk.Window):
         self.show_all()
 
     def on_results_search_changed(self, entry):
-        """Callback function for search box in results pane"""
-        self.options_search_entry_text = entry.get_text()
-        self.results_liststore_filter = self.results_liststore.filter_new()
-        self.results_liststore_filter.set_visible_func(
-            self.on_results_search_changed_filter)
-        self.sorted_model = Gtk.TreeModelSort(model=self.results_liststore_filter)
-        self.results_treeview.set_model(self.sorted_model)
-
-    def on_results_search_changed_filter(self, model, iter, data):
-        """ 
-        Filter function for results liststore. Returns True if row should be
-        visible, False if it should be hidden.
+        """Callback function for search box in results pane
+
+        The query is compiled once and evaluated over whole columns of the
+        results table. Only rows whose visibility changed are updated.
+        When many change, the TreeView is detached and the filter is
+        replaced, so neither reacts to every row. Rows already in the table
+        but not yet in the ListStore take their visibility from the table
+        when they are added.
         """
-        if not self.options_search_entry_text:
-            return True
-        for i in range(3):
-            # Compare text in search box to text in columns 0,1,2.
-            current_row = model.get_value(iter, i)
-            if current_row.lower().find(self.options_search_entry_text.lower()) != -1:
-                return True
+        try:
+            self.results_query = compile_query(entry.get_text())
+        except QueryError as e:
+            self.statusbar.push(0, f"Search: {e}")
+            return
+        # Positions in the TreeView change with the search.
+        self.results_selection.version = None
+        if self.results_spill:
+            self.load_results_page("first")
+            return
+        changes = self.results_table.apply_mask(self.results_query.mask(self.results_table))
+        n_shown = self.results_liststore.iter_n_children(None)
+        changes = [(position, visible) for position, visible in changes if position < n_shown]
+        if len(changes) < BULK_UPDATE_ROWS:
+            for position, visible in changes:
+                self.results_liststore[position][5] = visible
+            return
+        self.results_treeview.set_model(None)
+        self.results_liststore_filter = None
+        liststore = self.results_liststore
+        for position, visible in changes:
+            liststore.set_value(liststore.iter_nth_child(None, position), 5, visible)
+        self.results_liststore_filter = liststore.filter_new()
+        self.results_liststore_filter.set_visible_column(5)
+        self.results_treeview.set_model(self.results_liststore_filter)
+
+    def on_results_column_clicked(self, column, column_id):
+        """Sort the results by a column, reversing the order on a second click"""
+        descending = self.results_sort == (column_id, False)
+        self.results_sort = (column_id, descending)
+        for other_column in self.results_treeview.get_columns():
+            other_column.set_sort_indicator(other_column == column)
+        column.set_sort_order(Gtk.SortType.DESCENDING if descending else Gtk.SortType.ASCENDING)
+        self.sort_results()
+
+    def sort_results(self):
+        """Sort the results by the chosen column without blocking the UI"""
+        if self.results_sort is None or self.results_working:
+            return
+        if self.results_spill:
+            self.load_results_page("first")
+            return
+        threading.Thread(target=self.sort_results_worker, args=self.results_sort, daemon=True).start()
+
+    def sort_results_worker(self, column_id, descending):
+        """In background thread, compute the order of the results"""
+        order = self.results_table.sort_order(column_id, descending)
+        GLib.idle_add(self.apply_results_order, order)
+
+    def apply_results_order(self, order):
+        """Show the results in the order computed by sort_results_worker()"""
+        if self.results_working:
+            # clean_files_worker() sorts again when it finishes.
+            return False
+        if not self.results_table.apply_order(order):
+            # The results changed while sorting, so sort again.
+            self.sort_results()
+        elif order.new_order:
+            self.results_liststore.reorder(order.new_order)
+        return False
+
+    def append_result(self, row):
+        """Add a row to the results pane and to the results table"""
+        self.append_results([row])
+
+    def match_results(self, rows):
+        """Return whether each row matches the current search"""
+        if self.results_query:
+            return list(map(self.results_query.match_row, rows))
+        return [True] * len(rows)
+
+    def append_results(self, rows, detach=False):
+        """Add rows to the results table, and queue them for the results pane
+
+        This may run in a background thread; the ListStore is only changed
+        from the main loop. With detach, the TreeView is detached while the
+        rows are added, so it does not update once per row. Once the results
+        outgrow the memory budget, they move to a temporary database and
+        later rows go straight there.
+        """
+        if self.results_spill:
+            self.results_spill.extend(rows)
+            return
+        first_id = self.results_table.extend(rows, self.match_results)
+        GLib.idle_add(self.show_result_rows, self.results_generation, first_id, rows, detach)
+        if self.results_table.memory_estimate > self.preferences["results_memory_budget_mb"] * 1024 * 1024:
+            self.spill_results()
+
+    def show_result_rows(self, generation, first_id, rows, detach):
+        """Add rows queued by append_results() to the ListStore"""
+        if generation != self.results_generation:
+            return False
+        # A search may have run since the rows were added to the table.
+        visible = self.results_table.visible[first_id:first_id + len(rows)]
+        if detach:
+            self.results_treeview.set_model(None)
+        append = self.results_liststore.append
+        result_iters = self.result_iters
+        for row, row_visible in zip(rows, visible):
+            result_iters[row[2]] = append(row + [row_visible])
+        if detach:
+            self.results_treeview.set_model(self.results_liststore_filter)
+        return False
+
+    def clear_results(self):
+        """Remove all rows from the results table, and from the ListStore in the main loop"""
+        self.results_generation += 1
+        self.results_table.clear()
+        GLib.idle_add(self.clear_result_rows)
+
+    def clear_result_rows(self):
+        """Remove all rows from the ListStore"""
+        self.results_liststore.clear()
+        self.result_iters.clear()
+        return False
+
+    def spill_results(self):
+        """Move the results from memory into a temporary database"""
+        self.results_spill = SpillStore()
+        for rows in self.results_table.row_batches(INSERT_BATCH_SIZE):
+            self.results_spill.extend(rows)
+        self.results_spill.flush()
+        # The file listings kept for replaying directories grow with the
+        # results, so they go too.
+        self.scan_cache.drop_names()
+        self.preview_classes.clear()
+        self.clear_results()
+        GLib.idle_add(self.statusbar.push, 0, "The results exceed the memory limit, so they are kept on disk")
+
+    def load_results_page(self, page="first"):
+        """Show a page of results from disk, searching and sorting in SQL
+
+        page is "first", "next", "previous", or "current" to reload the
+        page shown. Each request supersedes the ones before it: a query
+        still running is interrupted, and a stale page is not shown.
+        """
+        where, params = self.results_query.sql()
+        keys = self.results_page_keys
+        after = before = None
+        inclusive = False
+        if page == "next" and keys:
+            after = keys[-1]
+        elif page == "previous" and keys:
+            before = keys[0]
+        elif page == "current" and keys:
+            after = keys[0]
+            inclusive = True
+        else:
+            page = "first"
+        self.results_page_generation += 1
+        self.results_spill.interrupt()
+        threading.Thread(target=self.load_results_page_worker, daemon=True,
+                         args=(self.results_spill, self.results_page_generation, page, where, params,
+                               self.results_sort, after, before, inclusive)).start()
+        return False
+
+    def load_results_page_worker(self, spill, generation, page, where, params, sort, after, before, inclusive):
+        """In background thread, query one page of results"""
+        if generation != self.results_page_generation:
+            return
+        try:
+            rows, keys = spill.page(PAGE_SIZE, where, params, sort, after, before, inclusive)
+            total = spill.count(where, params)
+        except (sqlite3.ProgrammingError, sqlite3.OperationalError):
+            # A newer request interrupted this query, or a new preview
+            # closed the database.
+            return
+        GLib.idle_add(self.show_results_page, spill, generation, page, total, rows, keys)
+
+    def show_results_page(self, spill, generation, page, total, rows, keys):
+        """Replace the rows in the results pane with one page"""
+        if spill is not self.results_spill or generation != self.results_page_generation:
+            return False
+        if page == "first":
+            offset = 0
+        elif page == "next":
+            offset = self.results_page_offset + len(self.results_page_keys)
+        elif page == "previous":
+            offset = max(0, self.results_page_offset - len(rows))
+        else:
+            offset = self.results_page_offset
+        self.results_page_offset = offset
+        self.results_page_keys = keys
+        # Detach the model so the TreeView does not update once per row.
+        self.results_treeview.set_model(None)
+        self.results_liststore.clear()
+        self.results_table.clear()
+        self.result_iters.clear()
+        for row in rows:
+            self.results_table.append(row)
+            self.results_liststore.append(row + [True])
+        self.results_treeview.set_model(self.results_liststore_filter)
+        if rows:
+            self.results_page_label.set_text(f"Rows {offset + 1}-{offset + len(rows)} of {total}")
+        else:
+            self.results_page_label.set_text(f"No rows of {total}")
+        self.previous_page_button.set_sensitive(offset > 0)
+        self.next_page_button.set_sensitive(offset + len(rows) < total)
+        self.results_page_box.show()
         return False
 
     def on_selection_changed(self, selection):
-        """Enable whitelist button on toolbar when 1+ rows are selected"""
-        model, paths = selection.get_selected_rows()
-        sensitive = len(paths) > 0
+        """Enable whitelist button on toolbar when 1+ rows are selected
+
+        A change that is not being followed in the selection ranges, for
+        example from the keyboard, makes the ranges stale.
+        """
+        if not self.results_selection_tracking:
+            self.results_selection.version = None
+        sensitive = selection.count_selected_rows() > 0
         self.skip_list_button.set_sensitive(sensitive)
 
+    def track_selection(self):
+        """Accept selection changes until the current event is handled"""
+        self.results_selection.version = self.results_table.version
+        self.results_selection_tracking = True
+        GLib.idle_add(self.end_selection_tracking)
+
+    def end_selection_tracking(self):
+        # A change after this, such as one GTK defers to the button
+        # release, is not followed.
+        self.results_selection_tracking = False
+        return False
+
+    def on_results_button_press(self, treeview, event):
+        """Follow a left click in the selection ranges, the way GTK selects"""
+        if event.button != 1 or event.type != Gdk.EventType.BUTTON_PRESS:
+            return False
+        hit = treeview.get_path_at_pos(int(event.x), int(event.y))
+        if hit is None:
+            return False
+        position = hit[0].get_indices()[0]
+        if event.state & Gdk.ModifierType.SHIFT_MASK:
+            self.results_selection.select_to(position, bool(event.state & Gdk.ModifierType.CONTROL_MASK))
+        elif event.state & Gdk.ModifierType.CONTROL_MASK:
+            self.results_selection.toggle(position)
+        else:
+            self.results_selection.select_only(position)
+        self.track_selection()
+        return False
+
+    def on_results_select_all(self, treeview):
+        """Select all rows shown in the results pane as one range"""
+        self.results_selection.select_all(self.results_liststore_filter.iter_n_children(None))
+        self.track_selection()
+        return False
+
+    def on_results_unselect_all(self, treeview):
+        self.results_selection.clear()
+        self.track_selection()
+        return False
+
+    def selected_row_ids(self):
+        """Return the ids of the selected rows in view order
+
+        The ranges followed from clicks are used when no other change was
+        made since and they agree with the TreeView's count and range
+        ends. Otherwise they are rebuilt from the TreeView, which costs one
+        TreePath per selected row.
+        """
+        tree_selection = self.results_treeview.get_selection()
+        selection = self.results_selection
+        agrees = (selection.version == self.results_table.version
+                  and len(selection) == tree_selection.count_selected_rows()
+                  and all(tree_selection.path_is_selected(Gtk.TreePath(position))
+                          for start, stop in selection.ranges for position in (start, stop - 1)))
+        if not agrees:
+            _model, paths = tree_selection.get_selected_rows()
+            selection.set_positions(path.get_indices()[0] for path in paths)
+            selection.version = self.results_table.version
+        return selection.take(self.results_table.visible_ids())
+
+    def skip_rows(self, row_ids):
+        """Always skip the files in some rows and remove the rows from the results"""
+        if self.results_working:
+            self.statusbar.push(0, "Wait for the results to finish before skipping files")
+            return
+        paths = list(map(self.results_table.paths.__getitem__, row_ids))
+        if not paths:
+            return
+        self.skip_list.update(files=paths)
+        message = f"Skipped: {paths[0]}" if len(paths) == 1 else f"Skipped {len(paths)} files"
+        if self.results_spill:
+            self.start_skip_worker(lambda spill: spill.delete_paths(paths), "current", message)
+        else:
+            self.remove_result_rows(row_ids)
+            self.start_skip_worker(None, None, message)
+
+    def skip_directory(self, dirpath):
+        """Always skip a directory and remove the rows below it from the results"""
+        if self.results_working:
+            self.statusbar.push(0, "Wait for the results to finish before skipping files")
+            return
+        self.skip_list.update(directories=[dirpath])
+        message = f"Skipped directory: {dirpath}"
+        if self.results_spill:
+            self.start_skip_worker(lambda spill: spill.delete(*below_where(dirpath)), "first", message)
+        else:
+            self.remove_result_rows(self.results_table.ids_below(dirpath))
+            self.start_skip_worker(None, None, message)
+
+    def skip_search(self):
+        """Always skip every file matching the search"""
+        if not self.results_query:
+            return
+        if self.results_spill and not self.results_working:
+            where, params = self.results_query.sql()
+            self.start_skip_worker(
+                lambda spill: spill.delete(where, params, on_paths=lambda paths: self.skip_list.update(files=paths)),
+                "first", None)
+            return
+        self.skip_rows(self.results_table.visible_ids())
+
+    def start_skip_worker(self, delete, page, message):
+        """Delete skipped rows from disk and save the skip list without blocking the UI
+
+        delete is None if the rows were already removed from memory, or
+        is called with the SpillStore and returns the number of rows
+        deleted. Then page of the results is shown again. message is
+        shown when done, or None to report the number of rows deleted.
+        """
+        self.statusbar.push(0, "Skipping files")
+        threading.Thread(target=self.skip_worker, args=(self.results_spill, delete, page, message)).start()
+
+    def skip_worker(self, spill, delete, page, message):
+        """In background thread, delete skipped rows from disk and save the skip list"""
+        count = None
+        if delete is not None:
+            try:
+                count = delete(spill)
+            except (sqlite3.ProgrammingError, sqlite3.OperationalError):
+                # A new preview closed the database.
+                spill = None
+        self.skip_list.save()
+        GLib.idle_add(self.finish_skip, spill, page, message or f"Skipped {count} files")
+
+    def finish_skip(self, spill, page, message):
+        """Show the results again after skip_worker()"""
+        if spill is not None and spill is self.results_spill:
+            self.load_results_page(page)
+        self.statusbar.push(0, message)
+        return False
+
+    def remove_result_rows(self, row_ids):
+        """Remove many rows from the results pane with the TreeView detached"""
+        table = self.results_table
+        self.results_treeview.set_model(None)
+        if len(row_ids) > len(table) // 2:
+            # Refilling with the rows that stay takes fewer calls.
+            table.remove_ids(row_ids)
+            self.results_liststore.clear()
+            self.result_iters.clear()
+            for row_id in table.view_order:
+                row = table.row(row_id)
+                self.result_iters[row[2]] = self.results_liststore.append(row + [table.visible[row_id]])
+        else:
+            for row_id in row_ids:
+                self.result_iters.pop(table.paths[row_id], None)
+            for position in table.remove_ids(row_ids):
+                self.results_liststore.remove(self.results_liststore.iter_nth_child(None, position))
+        self.results_treeview.set_model(self.results_liststore_filter)
+
     def on_copy_path_activated(self, widget, filenames):
         """Copy filename to clipboard"""
         clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
@@ -459,23 +947,34 @@ class BleachBitWindow(Gtk.Window):
         # 3 is the right mouse button
         if not event.button == 3:
             return
-        selection = self.results_treeview.get_selection()
-        model, pathlist = selection.get_selected_rows()
-        filenames = []
-        for path in pathlist:
-            tree_iter = model.get_iter(path)
-            filenames.append(model.get_value(tree_iter, 2))
+        # Look up the selected rows only when a menu item needs them.
+        n_selected = self.results_treeview.get_selection().count_selected_rows()
+        hit = widget.get_path_at_pos(int(event.x), int(event.y))
+        clicked_dir = os.path.dirname(self.results_liststore_filter[hit[0]][2]) if hit else None
         menu = Gtk.Menu()
         copy_path_item = Gtk.MenuItem.new_with_label("Copy path")
-        copy_path_item.connect(
-            "activate", self.on_copy_path_activated, filenames)
+        copy_path_item.connect("activate", lambda item: self.on_copy_path_activated(
+            item, list(map(self.results_table.paths.__getitem__, self.selected_row_ids()))))
+        copy_path_item.set_sensitive(n_selected > 0)
         menu.append(copy_path_item)
         open_file_location_item = Gtk.MenuItem.new_with_label(
             "Open file location")
         menu.append(open_file_location_item)
-        skip_item = Gtk.MenuItem.new_with_label("Always skip this file")
-        skip_item.connect("activate", lambda _item: self.on_skip_file_clicked(filenames))
+        skip_item = Gtk.MenuItem.new_with_label(
+            "Always skip this file" if n_selected == 1 else f"Always skip {n_selected} selected files")
+        skip_item.connect("activate", self.on_skip_file_clicked)
+        skip_item.set_sensitive(n_selected > 0)
         menu.append(skip_item)
+        skip_dir_item = Gtk.MenuItem.new_with_label("Always skip this directory")
+        if clicked_dir:
+            skip_dir_item.set_tooltip_text(clicked_dir)
+            skip_dir_item.connect("activate", lambda _item: self.skip_directory(clicked_dir))
+        skip_dir_item.set_sensitive(bool(clicked_dir))
+        menu.append(skip_dir_item)
+        skip_search_item = Gtk.MenuItem.new_with_label("Always skip all matching the search")
+        skip_search_item.connect("activate", lambda _item: self.skip_search())
+        skip_search_item.set_sensitive(bool(self.results_query))
+        menu.append(skip_search_item)
         menu.show_all()
         menu.popup(None, None, None, None, event.button, event.time)
         # True maintains selection of multiple rows.
@@ -484,20 +983,327 @@ class BleachBitWindow(Gtk.Window):
     def clean_files_worker(self, is_delete=True):
         """In background thread, run a worker to populate the liststore
 
-        This simulates a worker that cleans the system 
+        Preview lists the real files for the selected options. Clean
+        simulates a worker that cleans the system.
         """
         self.abort_event.clear()
         self.set_toolbar_buttons_working(True, True)
         self.show_right_pane(self.file_results_vbox)
-        self.results_liststore.clear()
-        for row in self.fake_cleaner_iterator(is_delete):
+        self.results_live = False
+        self.results_working = True
+        if self.results_spill:
+            self.results_spill.close()
+            self.results_spill = None
+            self.results_page_box.hide()
+        self.clear_results()
+        if is_delete:
+            # The scan cache lists file names in the cleaned locations.
+            self.scan_cache.clear()
+            self.preview_classes.clear()
+            if self.preferences["low_impact"]:
+                self.start_low_impact()
+            batches = (([row], False) for row in self.fake_cleaner_iterator(is_delete, self.results_throttle))
+        else:
+            self.scan_cache.keep_names = True
+            batches = self.preview_iterator()
+        # Rows from unchanged directories are added together, with the
+        # TreeView detached; freshly listed rows appear as they are found.
+        pending = []
+        for rows, cached in batches:
+            if self.abort_event.is_set():
+                break
+            if cached:
+                pending.extend(rows)
+                continue
+            if pending:
+                self.append_results(pending, detach=True)
+                pending = []
+            self.append_results(rows)
+        if pending and not self.abort_event.is_set():
+            self.append_results(pending, detach=True)
+        if self.results_spill:
+            self.results_spill.finish()
+        # Queued after the last rows, so they are in the ListStore first.
+        GLib.idle_add(self.finish_results)
+        if not is_delete:
+            self.watch_preview_locations()
+            self.scan_cache.save()
+            self.results_live = True
+        self.results_throttle = None
+        self.set_toolbar_buttons_working(False, True)
+
+    def finish_results(self):
+        """Sort the results, or show the first page, once every row is in the results pane"""
+        self.results_working = False
+        if self.results_spill:
+            self.load_results_page("first")
+        else:
+            self.sort_results()
+        return False
+
+    def start_low_impact(self):
+        """Lower this thread's priority and limit its rate for a low-impact clean"""
+        applied = throttle.set_idle_priority()
+        self.results_throttle = throttle.Throttle(
+            self.preferences["low_impact_mb_per_second"] * 1024 * 1024,
+            self.preferences["low_impact_files_per_second"])
+        self.low_impact_priorities = ", ".join(applied) or "normal priority"
+        GLib.idle_add(self.results_rate_label.show)
+        GLib.timeout_add_seconds(1, self.update_rate_label, self.results_throttle)
+
+    def update_rate_label(self, results_throttle):
+        """Show the effective rate of a low-impact clean, once a second while it runs"""
+        if results_throttle is not self.results_throttle:
+            self.results_rate_label.hide()
+            return False
+        bytes_per_second, files_per_second = results_throttle.effective_rate()
+        text = (f"Low impact ({self.low_impact_priorities}): {format_file_size(int(bytes_per_second))}/s shredded, "
+                f"{files_per_second:.1f} files/s")
+        if results_throttle.reason:
+            text += f", slowed to {results_throttle.factor:.0%} because of {results_throttle.reason}"
+        self.results_rate_label.set_text(text)
+        return True
+
+    def get_selected_options(self):
+        """Return a list of (cleaner, option) tuples selected in the options pane"""
+        selected = []
+        for cleaner_row in self.treestore_options:
+            for option_row in cleaner_row.iterchildren():
+                if option_row[1]:
+                    selected.append((cleaner_row[0], option_row[0]))
+        return selected
+
+    def classify_path(self, path):
+        """Return the (cleaner, option) a file belongs to, or None"""
+        for cleaner_name, option_name, _root, pattern in self.preview_locations:
+            if pattern.match(path):
+                return cleaner_name, option_name
+        return None
+
+    def preview_roots(self):
+        """Return the selected root directories, omitting any nested in another"""
+        roots = []
+        for root in sorted({location[2] for location in self.preview_locations}):
+            if not any(root.startswith(os.path.join(outer, "")) for outer in roots):
+                roots.append(root)
+        return roots
+
+    def preview_iterator(self):
+        """Yield (rows, cached) for the files matching the selected options
+
+        Rows come in one batch per directory. Directories that did not
+        change since the previous preview are replayed from the scan cache
+        instead of being listed again, with cached True.
+        """
+        locations = []
+        for cleaner_name, option_name in self.get_selected_options():
+            root, pattern = option_location(cleaner_data[cleaner_name][option_name]["path"])
+            locations.append((cleaner_name, option_name, root, pattern))
+        # Match the deepest root first, so ~/.cache/chrome is attributed to
+        # Chrome before the System cache under ~/.cache claims it.
+        locations.sort(key=lambda location: len(location[2]), reverse=True)
+        self.preview_locations = locations
+        for root in self.preview_roots():
+            if self.needs_helper(root):
+                for path, size in self.helper_walk(root):
+                    match = self.classify_path(path)
+                    if match and not self.skip_list.contains(path):
+                        yield [[match[0], match[1], path, size, ""]], False
+                continue
+            for dirpath, entry, cached in self.scan_cache.walk(root, self.abort_event):
+                rows = self.directory_rows(dirpath, entry)
+                if rows:
+                    yield rows, cached
+
+    def directory_rows(self, dirpath, entry):
+        """Return the result rows for the files directly in one directory
+
+        Which option each file belongs to is remembered per scan cache
+        entry, so replaying an unchanged directory does not match every
+        path against the option patterns again.
+        """
+        if self.skip_list.skips_directory(dirpath):
+            return []
+        locations = self.preview_locations
+        key = [location[:2] for location in locations]
+        saved = self.preview_classes.get(dirpath)
+        if saved is not None and saved[0] is entry and saved[1] == key:
+            classes = saved[2]
+        else:
+            classes = self.classify_directory(dirpath, entry["names"])
+            if not self.results_spill:
+                self.preview_classes[dirpath] = (entry, key, classes)
+        prefix = os.path.join(dirpath, "")
+        if isinstance(classes, int):
+            if classes < 0:
+                return []
+            cleaner_name, option_name = locations[classes][:2]
+            rows = [[cleaner_name, option_name, prefix + name, size, ""]
+                    for name, size in zip(entry["names"], entry["sizes"])]
+        else:
+            rows = [[locations[index][0], locations[index][1], prefix + name, size, ""]
+                    for name, size, index in zip(entry["names"], entry["sizes"], classes) if index >= 0]
+        if self.skip_list.files:
+            rows = [row for row in rows if row[2] not in self.skip_list.files]
+        return rows
+
+    def classify_directory(self, dirpath, names):
+        """Return the index in preview_locations of each file in a directory
+
+        Files matching no location get -1. If every file gets the same
+        index, that index is returned instead of a list.
+        """
+        prefix = os.path.join(dirpath, "")
+        # A pattern starts with its root, so only roots at or above the
+        # directory can match.
+        candidates = [(index, location[3]) for index, location in enumerate(self.preview_locations)
+                      if prefix.startswith(os.path.join(location[2], ""))]
+        if not candidates:
+            return -1
+        classes = [next((index for index, pattern in candidates if pattern.match(prefix + name)), -1)
+                   for name in names]
+        if len(set(classes)) <= 1:
+            return classes[0] if classes else -1
+        return classes
+
+    def needs_helper(self, root):
+        """Return True if a root should be listed by the privileged helper"""
+        if not self.preferences["privileged_helper"] or os.geteuid() == 0:
+            return False
+        if not any(root == allowed or root.startswith(os.path.join(allowed, ""))
+                   for allowed in privileged_helper.ALLOWED_ROOTS):
+            return False
+        # Root-owned locations usually hold files the user cannot read or delete.
+        return not os.access(root, os.W_OK)
+
+    def helper_walk(self, root):
+        """Yield (path, size) for the files below root, listed by the privileged helper
+
+        The helper is started on first use, which asks for the administrator
+        password once per session.
+        """
+        try:
+            if self.helper is None:
+                self.helper = privileged_helper.HelperClient()
+            for path, size in self.helper.walk(root):
+                if self.abort_event.is_set():
+                    return
+                yield path, size
+        except (OSError, privileged_helper.HelperError) as e:
+            if self.helper:
+                self.helper.close()
+                self.helper = None
+            GLib.idle_add(self.statusbar.push, 0, f"Privileged helper: {e}")
+
+    def watch_preview_locations(self):
+        """Watch the scanned directories so the results pane stays live"""
+        if not self.watcher:
+            return
+        for root in self.preview_roots():
+            for dirpath in self.scan_cache.directories(root):
+                if not self.watcher.watch(dirpath):
+                    if self.watcher.limit_reached:
+                        return
+
+    def on_watched_path_changed(self, mask, path):
+        """Called from the inotify thread when a watched directory changes"""
+        if mask & inotify_watcher.IN_DELETE_SELF:
+            self.scan_cache.invalidate(path)
+        else:
+            self.scan_cache.invalidate(os.path.dirname(path))
+        GLib.idle_add(self.update_live_result, mask, path)
+
+    def update_live_result(self, mask, path):
+        """Apply one file system change to the preview results"""
+        if not self.results_live or self.results_spill:
+            return False
+        if mask & inotify_watcher.IN_ISDIR:
+            if mask & (inotify_watcher.IN_CREATE | inotify_watcher.IN_MOVED_TO):
+                self.watcher.watch(path)
+            return False
+        if mask & (inotify_watcher.IN_DELETE | inotify_watcher.IN_MOVED_FROM):
+            tree_iter = self.result_iters.pop(path, None)
+            if tree_iter is not None:
+                position = self.results_liststore.get_path(tree_iter).get_indices()[0]
+                self.results_table.remove_at(position)
+                self.results_liststore.remove(tree_iter)
+            return False
+        if self.skip_list.contains(path):
+            return False
+        match = self.classify_path(path)
+        if match is None:
+            return False
+        try:
+            size = os.lstat(path).st_size
+        except OSError:
+            return False
+        tree_iter = self.result_iters.get(path)
+        if tree_iter is None:
+            self.append_result([match[0], match[1], path, size, ""])
+        else:
+            position = self.results_liststore.get_path(tree_iter).get_indices()[0]
+            self.results_table.set_size(position, size)
+            self.results_liststore.set_value(tree_iter, 3, size)
+        return False
+
+    def estimate_worker(self):
+        """Runs as a background thread to estimate the size of each selected option
+
+        This sums the allocated blocks per directory without building result
+        rows, and samples trees too large to finish within ESTIMATE_SECONDS.
+        """
+        self.set_toolbar_buttons_working(True, True)
+        GLib.idle_add(self.clear_option_estimates)
+        options = self.get_selected_options()
+        locations = {(cleaner_name, option_name): option_location(cleaner_data[cleaner_name][option_name]["path"])
+                     for cleaner_name, option_name in options}
+        roots = {location[0] for location in locations.values()}
+        time_limit = ESTIMATE_SECONDS / max(1, len(options))
+        cleaner_estimates = {}
+        for cleaner_name, option_name in options:
             if self.abort_event.is_set():
                 break
-            self.results_liststore.append(row)
+            root, pattern = locations[(cleaner_name, option_name)]
+            # As in the preview, a nested location such as ~/.cache/chrome
+            # belongs to its own option rather than to ~/.cache.
+            exclude = [other for other in roots if other.startswith(os.path.join(root, ""))]
+            estimate = size_estimate.estimate(root, pattern, exclude, time_limit)
+            cleaner_estimates.setdefault(cleaner_name, []).append(estimate)
+            GLib.idle_add(self.set_option_estimate, cleaner_name, option_name, estimate)
+        for cleaner_name, estimates in cleaner_estimates.items():
+            bounds = [estimate.bound for estimate in estimates]
+            bound = None if None in bounds else int(sum(b ** 2 for b in bounds) ** 0.5)
+            total = size_estimate.Estimate(sum(estimate.bytes for estimate in estimates),
+                                           sum(estimate.files for estimate in estimates),
+                                           bound, all(estimate.exact for estimate in estimates))
+            GLib.idle_add(self.set_option_estimate, cleaner_name, None, total)
         self.set_toolbar_buttons_working(False, True)
 
-    def fake_cleaner_iterator(self, is_delete=True):
-        """Simulate a worker iterator that cleans the system"""
+    def clear_option_estimates(self):
+        """Clear the size column of the options pane"""
+        for cleaner_row in self.treestore_options:
+            cleaner_row[2] = ""
+            for option_row in cleaner_row.iterchildren():
+                option_row[2] = ""
+        return False
+
+    def set_option_estimate(self, cleaner_name, option_name, estimate):
+        """Show an estimate for an option, or for a cleaner when option_name is None"""
+        for cleaner_row in self.treestore_options:
+            if cleaner_row[0] != cleaner_name:
+                continue
+            if option_name is None:
+                cleaner_row[2] = format_estimate(estimate)
+            for option_row in cleaner_row.iterchildren():
+                if option_row[0] == option_name:
+                    option_row[2] = format_estimate(estimate)
+        return False
+
+    def fake_cleaner_iterator(self, is_delete=True, results_throttle=None):
+        """Simulate a worker iterator that cleans the system
+
+        With a throttle from low-impact mode, each file waits for its turn.
+        """
         num_files = random.randint(5, 100)
         for _ in range(num_files):
 
@@ -530,6 +1336,9 @@ class BleachBitWindow(Gtk.Window):
             else:
                 result = ""
 
+            if results_throttle and not results_throttle.wait(size if result == "shred" else 0, self.abort_event):
+                return
+
             # Sleep simulates waiting for disk I/O.
             # Delete is slower than preview.
             sleep_time_sec = random.uniform(0.01, 0.2)
@@ -562,6 +1371,109 @@ class BleachBitWindow(Gtk.Window):
 
         self.set_toolbar_buttons_working(False, False)
 
+    def on_preferences_activated(self, widget):
+        """Edit and save the preferences"""
+        dialog = Gtk.Dialog(title="Preferences", transient_for=self, modal=True)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                           Gtk.STOCK_OK, Gtk.ResponseType.OK)
+        grid = Gtk.Grid(column_spacing=6, row_spacing=6, border_width=10)
+        budget_spin = Gtk.SpinButton.new_with_range(16, 1024 * 1024, 64)
+        budget_spin.set_value(self.preferences["results_memory_budget_mb"])
+        budget_spin.set_tooltip_text(
+            "Results beyond this size are kept in a temporary file and shown one page at a time.")
+        grid.attach(Gtk.Label(label="Memory limit for results (MB)", xalign=0), 0, 0, 1, 1)
+        grid.attach(budget_spin, 1, 0, 1, 1)
+        helper_check = Gtk.CheckButton(label="Use a privileged helper for system locations")
+        helper_check.set_active(self.preferences["privileged_helper"])
+        helper_check.set_tooltip_text(
+            "Preview lists root-owned locations such as /var/log through a helper started with pkexec.")
+        grid.attach(helper_check, 0, 1, 2, 1)
+        low_impact_check = Gtk.CheckButton(label="Clean in low-impact mode")
+        low_impact_check.set_active(self.preferences["low_impact"])
+        low_impact_check.set_tooltip_text(
+            "Clean at idle I/O priority and low CPU priority, within the limits below, "
+            "and slow down when the system is busy.")
+        grid.attach(low_impact_check, 0, 2, 2, 1)
+        bytes_spin = Gtk.SpinButton.new_with_range(1, 10000, 10)
+        bytes_spin.set_value(self.preferences["low_impact_mb_per_second"])
+        grid.attach(Gtk.Label(label="Low-impact shred limit (MB/s)", xalign=0), 0, 3, 1, 1)
+        grid.attach(bytes_spin, 1, 3, 1, 1)
+        files_spin = Gtk.SpinButton.new_with_range(1, 100000, 10)
+        files_spin.set_value(self.preferences["low_impact_files_per_second"])
+        grid.attach(Gtk.Label(label="Low-impact delete limit (files/s)", xalign=0), 0, 4, 1, 1)
+        grid.attach(files_spin, 1, 4, 1, 1)
+        dialog.get_content_area().add(grid)
+        dialog.show_all()
+        if dialog.run() == Gtk.ResponseType.OK:
+            self.preferences["results_memory_budget_mb"] = budget_spin.get_value_as_int()
+            self.preferences["privileged_helper"] = helper_check.get_active()
+            self.preferences["low_impact"] = low_impact_check.get_active()
+            self.preferences["low_impact_mb_per_second"] = bytes_spin.get_value_as_int()
+            self.preferences["low_impact_files_per_second"] = files_spin.get_value_as_int()
+            preferences.save_preferences(self.preferences)
+        dialog.destroy()
+
+    def on_make_chaff_activated(self, widget):
+        """Ask where to make chaff and how much, then start making it"""
+        dialog = Gtk.Dialog(title="Make chaff", transient_for=self, modal=True)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                           "Make chaff", Gtk.ResponseType.OK)
+        grid = Gtk.Grid(column_spacing=6, row_spacing=6, border_width=10)
+        folder_button = Gtk.FileChooserButton(
+            title="Output folder", action=Gtk.FileChooserAction.SELECT_FOLDER)
+        count_spin = Gtk.SpinButton.new_with_range(0, 10000000, 100)
+        count_spin.set_value(1000)
+        budget_spin = Gtk.SpinButton.new_with_range(0, 1000000, 10)
+        budget_spin.set_tooltip_text("Stop after writing this many megabytes. Zero means no limit.")
+        for row, (label, widget) in enumerate((("Output folder", folder_button),
+                                               ("Number of files", count_spin),
+                                               ("Size limit (MB)", budget_spin))):
+            grid.attach(Gtk.Label(label=label, xalign=0), 0, row, 1, 1)
+            grid.attach(widget, 1, row, 1, 1)
+        dialog.get_content_area().add(grid)
+        dialog.show_all()
+        response = dialog.run()
+        output_dir = folder_button.get_filename()
+        file_count = count_spin.get_value_as_int()
+        byte_budget = budget_spin.get_value_as_int() * 1024 * 1024
+        dialog.destroy()
+        if response != Gtk.ResponseType.OK or not output_dir:
+            return
+        if not file_count and not byte_budget:
+            self.statusbar.push(0, "Enter a number of files or a size limit to make chaff")
+            return
+        threading.Thread(target=self.chaff_worker,
+                         args=(output_dir, file_count, byte_budget)).start()
+
+    def chaff_worker(self, output_dir, file_count, byte_budget):
+        """Runs as a background thread to make chaff"""
+        self.set_toolbar_buttons_working(True, False)
+        self.show_right_pane(self.chaff_vbox)
+        GLib.idle_add(self.update_chaff_progress, 0.0, f"Making chaff in {output_dir}")
+        start_time = time.time()
+        fraction = 0.0
+        try:
+            for files_done, bytes_done in chaff.make_chaff(output_dir, file_count, byte_budget,
+                                                           abort_event=self.abort_event):
+                fraction = min(1.0, max(files_done / file_count if file_count else 0,
+                                        bytes_done / byte_budget if byte_budget else 0))
+                files_per_minute = files_done * 60 / max(time.time() - start_time, 0.001)
+                text = (f"Made {files_done} files ({format_file_size(bytes_done)}) in {output_dir} "
+                        f"at {files_per_minute:.0f} files per minute")
+                GLib.idle_add(self.update_chaff_progress, fraction, text)
+        except (OSError, RuntimeError) as e:
+            # For example, the output is not a directory or the disk is full.
+            # RuntimeError covers a broken process pool.
+            GLib.idle_add(self.update_chaff_progress, fraction, f"Could not make chaff in {output_dir}: {e}")
+        finally:
+            self.set_toolbar_buttons_working(False, False)
+
+    def update_chaff_progress(self, fraction, text):
+        """Show the progress of chaff_worker() in the chaff pane"""
+        self.chaff_label.set_text(text)
+        self.chaff_progressbar.set_fraction(fraction)
+        return False
+
     def set_toolbar_buttons_working(self, is_working, is_files_mode):
         """Set the toolbar buttons to a working state or not
 
@@ -573,23 +1485,14 @@ class BleachBitWindow(Gtk.Window):
         self.abort_event.clear()
         self.abort_button.set_sensitive(is_working)
         self.preview_button.set_sensitive(not is_working)
+        self.estimate_button.set_sensitive(not is_working)
         self.clean_button.set_sensitive(not is_working)
         self.wipe_free_space_button.set_sensitive(not is_working)
         self.skip_list_button.set_sensitive(not is_working and is_files_mode)
 
     def on_skip_file_clicked(self, button):
-        # Get the selected rows
-        selection = self.results_treeview.get_selection()
-        model, paths = selection.get_selected_rows()
-        for path in paths:
-            # Get the filename
-            filename = model[path][2]
-
-            print(f"Whitelisted: {filename}")
-        if len(paths) == 1:
-            self.statusbar.push(0, f"Whitelisted: {filename}")
-        else:
-            self.statusbar.push(0, f"Whitelisted {len(paths)} file(s)")
+        """Always skip the selected files"""
+        self.skip_rows(self.selected_row_ids())
 
 
 if __name__ == "__main__":
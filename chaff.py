@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Make chaff: plausible decoy documents
+
+Chaff hides the documents that matter among many that look similar. Each
+document is an email-like message whose subject and body come from a
+word-level Markov chain trained on the small corpus below.
+
+Batches of documents are generated in a process pool. Each worker process
+writes its own files, so the text never crosses the process boundary.
+"""
+
+# standard library imports
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import time
+
+CORPUS = """
+Please review the attached draft before the meeting on Thursday and send me your comments.
+The quarterly numbers look better than we expected, but the travel budget is still over.
+I spoke with the vendor this morning and they agreed to move the delivery date to next week.
+Can you confirm whether the contract was signed by both parties before the end of the month?
+We need to schedule a call with the regional team to discuss the new reporting requirements.
+The board asked for a summary of the project status and the remaining risks.
+Thanks for your help with the presentation, the client was very pleased with the results.
+I will be out of the office on Friday, so please forward any urgent requests to the team.
+The updated policy applies to all employees and takes effect at the start of next quarter.
+Let me know if you have any questions about the invoice or the payment schedule.
+We reviewed the proposal and would like to discuss the budget and the timeline in more detail.
+The meeting has been moved to the large conference room on the third floor.
+Attached is the revised agenda for the planning session with the partners next week.
+Our team will prepare the final report once we receive the data from the field office.
+Please make sure the documents are filed before the deadline to avoid any delays.
+"""
+
+SENDERS = ("alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy")
+DOMAINS = ("example.com", "example.org", "example.net")
+
+# Files are written with one large buffered write each.
+WRITE_BUFFER_SIZE = 1024 * 1024
+FILES_PER_BATCH = 200
+
+# Documents are at least this many bytes.
+MIN_DOCUMENT_SIZE = 256
+
+
+def build_chain(text):
+    """Return a word-level Markov chain as a dict of word -> list of next words"""
+    chain = {}
+    for sentence in text.strip().splitlines():
+        words = ["<s>"] + sentence.split() + ["</s>"]
+        for current_word, next_word in zip(words, words[1:]):
+            chain.setdefault(current_word, []).append(next_word)
+    return chain
+
+
+CHAIN = build_chain(CORPUS)
+
+
+def make_sentence(rng, chain=CHAIN, max_words=40):
+    """Return one sentence generated from the chain"""
+    words = []
+    word = rng.choice(chain["<s>"])
+    while word != "</s>" and len(words) < max_words:
+        words.append(word)
+        word = rng.choice(chain[word])
+    return " ".join(words)
+
+
+def make_document(rng, target_size):
+    """Return an email-like document of roughly target_size bytes"""
+    sender = f"{rng.choice(SENDERS)}@{rng.choice(DOMAINS)}"
+    recipient = f"{rng.choice(SENDERS)}@{rng.choice(DOMAINS)}"
+    subject = make_sentence(rng, max_words=8).rstrip(".?,")
+    date = time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(rng.randint(1200000000, 1700000000)))
+    parts = [f"From: {sender}\nTo: {recipient}\nDate: {date}\nSubject: {subject}\n\n"]
+    size = len(parts[0])
+    while size < target_size:
+        paragraph = " ".join(make_sentence(rng) for _ in range(rng.randint(2, 6))) + "\n\n"
+        parts.append(paragraph)
+        size += len(paragraph)
+    return "".join(parts).encode("utf-8")
+
+
+def write_batch(output_dir, file_count, mean_size, seed, byte_limit=None):
+    """Generate and write one batch of documents
+
+    This runs in a worker process. The seed is unique per batch and also
+    names the files. The batch stops early rather than write more than
+    byte_limit bytes, cutting the last document short at a space.
+    Returns (files written, bytes written).
+    """
+    rng = random.Random(seed)
+    bytes_written = 0
+    files_written = 0
+    for file_index in range(file_count):
+        target_size = max(MIN_DOCUMENT_SIZE, int(rng.expovariate(1 / mean_size)))
+        data = make_document(rng, target_size)
+        if byte_limit is not None:
+            bytes_left = byte_limit - bytes_written
+            if bytes_left < MIN_DOCUMENT_SIZE:
+                break
+            if len(data) > bytes_left:
+                data = data[:bytes_left]
+                data = data[:data.rfind(b" ") + 1 or len(data)]
+        path = os.path.join(output_dir, f"{seed:016x}-{file_index:04d}.eml")
+        with open(path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write(data)
+        bytes_written += len(data)
+        files_written += 1
+    return files_written, bytes_written
+
+
+def make_chaff(output_dir, file_count=None, byte_budget=None, mean_size=8 * 1024,
+               abort_event=None, max_workers=None):
+    """Write chaff files until file_count or byte_budget is reached
+
+    At least one limit is required. This is a generator that yields
+    (files written, bytes written) after each finished batch, so the caller
+    can report progress. Setting abort_event stops it after the batches in
+    flight finish. Each batch is given a share of the byte budget that it
+    does not exceed, so the budget is never overshot.
+    """
+    if not file_count and not byte_budget:
+        raise ValueError("file_count or byte_budget is required")
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count() or 1
+    files_done = 0
+    bytes_done = 0
+    files_queued = 0
+    bytes_queued = 0
+    batch_index = 0
+    seed = random.SystemRandom().getrandbits(64)
+    # Spawn instead of fork, because the caller may be a GTK process with threads.
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=context) as executor:
+        pending = set()
+        # The files and bytes set aside for each batch in flight.
+        reserved = {}
+        while True:
+            aborted = abort_event is not None and abort_event.is_set()
+            if aborted:
+                for future in pending:
+                    future.cancel()
+            while not aborted and len(pending) < max_workers * 2:
+                batch_files = FILES_PER_BATCH
+                if file_count:
+                    batch_files = min(batch_files, file_count - files_queued)
+                batch_bytes = None
+                if byte_budget:
+                    bytes_left = byte_budget - bytes_queued
+                    if bytes_left < MIN_DOCUMENT_SIZE:
+                        break
+                    batch_files = min(batch_files, -(-bytes_left // mean_size))
+                    batch_bytes = min(bytes_left, batch_files * mean_size)
+                if batch_files <= 0:
+                    break
+                future = executor.submit(write_batch, output_dir, batch_files, mean_size, seed + batch_index,
+                                         batch_bytes)
+                pending.add(future)
+                reserved[future] = (batch_files, batch_bytes or 0)
+                files_queued += batch_files
+                bytes_queued += batch_bytes or 0
+                batch_index += 1
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                reserved_files, reserved_bytes = reserved.pop(future)
+                if future.cancelled():
+                    continue
+                batch_files, batch_bytes = future.result()
+                files_done += batch_files
+                bytes_done += batch_bytes
+                # Give back what the batch reserved but did not write.
+                files_queued += batch_files - reserved_files
+                if byte_budget:
+                    bytes_queued += batch_bytes - reserved_bytes
+            yield files_done, bytes_done
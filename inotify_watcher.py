@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Minimal inotify watcher using ctypes
+
+inotify is Linux-only. On other systems, or when libc lacks the inotify
+functions, is_available() returns False and the caller runs without live
+updates.
+"""
+
+# standard library imports
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if hasattr(libc, "inotify_init1"):
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            _libc = libc
+    return _libc
+
+
+def is_available():
+    """Return True if inotify can be used on this system"""
+    try:
+        return _load_libc() is not None
+    except OSError:
+        return False
+
+
+class InotifyWatcher(threading.Thread):
+    """Background thread that reports changes in watched directories
+
+    inotify is not recursive, so every directory must be added with
+    watch(). The callback is called from this thread as
+    callback(mask, path) where path is the full path of the changed entry;
+    test mask against the IN_* constants.
+    """
+
+    def __init__(self, callback):
+        super().__init__(daemon=True)
+        libc = _load_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.libc = libc
+        self.callback = callback
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wd_to_path = {}
+        self.path_to_wd = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.limit_reached = False
+
+    def watch(self, dirpath):
+        """Watch a directory, returning False if it could not be watched"""
+        with self.lock:
+            if dirpath in self.path_to_wd:
+                return True
+            if self.limit_reached:
+                return False
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                # ENOSPC means fs.inotify.max_user_watches is exhausted.
+                if ctypes.get_errno() == errno.ENOSPC:
+                    self.limit_reached = True
+                return False
+            self.wd_to_path[wd] = dirpath
+            self.path_to_wd[dirpath] = wd
+            return True
+
+    def stop(self):
+        """Stop the thread and release the inotify descriptor"""
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                readable, _, _ = select.select([self.fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    buf = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._dispatch(buf)
+        finally:
+            os.close(self.fd)
+
+    def _dispatch(self, buf):
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buf[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            with self.lock:
+                dirpath = self.wd_to_path.get(wd)
+                if mask & IN_IGNORED and dirpath is not None:
+                    del self.wd_to_path[wd]
+                    del self.path_to_wd[dirpath]
+            if dirpath is None or mask & IN_IGNORED:
+                continue
+            path = os.path.join(dirpath, name) if name else dirpath
+            self.callback(mask, path)
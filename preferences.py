@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Preferences saved as JSON in the BleachBit configuration directory"""
+
+# standard library imports
+import json
+import os
+
+DEFAULTS = {
+    # Results beyond this many megabytes move to a temporary database.
+    "results_memory_budget_mb": 512,
+    # List root-owned locations through the privileged helper.
+    "privileged_helper": False,
+    # Clean at idle priority within these rates, backing off when the system is busy.
+    "low_impact": False,
+    "low_impact_mb_per_second": 20,
+    "low_impact_files_per_second": 100,
+}
+
+
+def preferences_path():
+    """Return the path of the preferences file"""
+    return os.path.expanduser("~/.config/bleachbit/gui_next_gen.json")
+
+
+def load_preferences():
+    """Return the saved preferences, using defaults for missing values"""
+    preferences = dict(DEFAULTS)
+    try:
+        with open(preferences_path(), encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return preferences
+    preferences.update({key: value for key, value in saved.items() if key in DEFAULTS})
+    return preferences
+
+
+def save_preferences(preferences):
+    """Save the preferences"""
+    path = preferences_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(preferences, f, indent=2)
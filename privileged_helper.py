@@ -0,0 +1,339 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Small privileged helper for root-owned locations
+
+The GUI never runs as root. For locations such as /var/log, it starts this
+helper through pkexec and talks to it over stdin and stdout.
+
+Each request is one line of JSON holding many operations:
+
+    {"id": 1, "ops": [["stat", path], ["unlink", path], ["shred", path],
+                      ["listdir", path]]}
+
+The helper streams the results back in chunks, one line of JSON each, in
+the same order as the operations:
+
+    {"id": 1, "results": [[true, value], [false, "error message"]], "done": false}
+
+Batching avoids a round trip per file. As root, the helper only touches
+paths below ALLOWED_ROOTS.
+
+pkexec runs the root-owned installed copy at INSTALLED_HELPER with the
+system interpreter in isolated mode, so nothing the user can write (a
+virtual environment, or modules next to a checkout) runs as root. Install
+it with:
+
+    sudo install -D -o root -g root -m 0644 privileged_helper.py /usr/libexec/bleachbit/privileged_helper.py
+
+For testing, an unprivileged helper can be given other roots with --root,
+for example a temporary directory:
+
+    python3 privileged_helper.py --root /tmp/test-tree
+"""
+
+# standard library imports
+import argparse
+import json
+import os
+import stat
+import subprocess
+import sys
+import threading
+
+# The only locations a helper running as root will touch.
+ALLOWED_ROOTS = ("/var/log", "/tmp")
+
+# pkexec runs this interpreter on this copy of the helper, never the
+# ones the GUI was started from.
+SYSTEM_PYTHON = "/usr/bin/python3"
+INSTALLED_HELPER = "/usr/libexec/bleachbit/privileged_helper.py"
+
+# Results are sent back in chunks of this many operations.
+CHUNK_SIZE = 1024
+
+# Shred overwrites files in blocks of this size.
+SHRED_BLOCK_SIZE = 1024 * 1024
+
+
+class HelperError(RuntimeError):
+    """The helper process failed or broke the protocol"""
+
+
+def _is_below(path, roots):
+    """Return True if a resolved path is one of the roots or below one"""
+    return any(path == root or path.startswith(os.path.join(root, "")) for root in roots)
+
+
+def _check_opened(fd, expected, path, roots):
+    """Close fd and raise PermissionError unless it is open below the roots
+
+    This catches a directory swapped for a link after its path was checked.
+    """
+    opened = os.readlink(f"/proc/self/fd/{fd}") if os.path.isdir("/proc/self/fd") else expected
+    if not _is_below(opened, roots):
+        os.close(fd)
+        raise PermissionError(f"Outside the allowed locations: {path}")
+
+
+def _open_parent(path, roots):
+    """Open the parent directory of a path inside the allowed roots
+
+    Returns (directory descriptor, file name). Symbolic links in the parent
+    are resolved before the check, and operations use the descriptor, so
+    swapping a parent for a link afterwards cannot redirect them.
+    """
+    parent, name = os.path.split(os.path.abspath(path))
+    if not name or name in (".", ".."):
+        raise PermissionError(f"Invalid path: {path}")
+    real_parent = os.path.realpath(parent)
+    if not _is_below(real_parent, roots):
+        raise PermissionError(f"Outside the allowed locations: {path}")
+    dir_fd = os.open(real_parent, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    _check_opened(dir_fd, real_parent, path, roots)
+    return dir_fd, name
+
+
+def op_stat(path, roots):
+    """Return [size, allocated bytes, mtime in ns, is directory] without following links"""
+    dir_fd, name = _open_parent(path, roots)
+    try:
+        st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+    finally:
+        os.close(dir_fd)
+    return [st.st_size, getattr(st, "st_blocks", 0) * 512, st.st_mtime_ns, stat.S_ISDIR(st.st_mode)]
+
+
+def op_unlink(path, roots):
+    """Delete a file, link, or empty directory"""
+    dir_fd, name = _open_parent(path, roots)
+    try:
+        st = os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        if stat.S_ISDIR(st.st_mode):
+            os.rmdir(name, dir_fd=dir_fd)
+        else:
+            os.unlink(name, dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+    return None
+
+
+def op_shred(path, roots):
+    """Overwrite a regular file with zeros, truncate it, and delete it
+
+    Returns the number of bytes overwritten. Anything but a regular file
+    with a single link is refused: opening a FIFO could block forever, and
+    overwriting a hard link would destroy the contents of its other names.
+    """
+    dir_fd, name = _open_parent(path, roots)
+    try:
+        # O_NONBLOCK keeps the open from waiting on a FIFO.
+        fd = os.open(name, os.O_WRONLY | os.O_NOFOLLOW | os.O_NONBLOCK, dir_fd=dir_fd)
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise PermissionError(f"Not a regular file: {path}")
+            if st.st_nlink != 1:
+                raise PermissionError(f"File has other hard links: {path}")
+            block = bytes(min(SHRED_BLOCK_SIZE, st.st_size))
+            remaining = st.st_size
+            while remaining > 0:
+                remaining -= os.write(fd, block[:remaining])
+            os.fsync(fd)
+            os.ftruncate(fd, 0)
+        finally:
+            os.close(fd)
+        os.unlink(name, dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+    return st.st_size
+
+
+def op_listdir(path, roots):
+    """Return [[name, size], ...] for files and [name, ...] for subdirectories"""
+    real_path = os.path.realpath(path)
+    if not _is_below(real_path, roots):
+        raise PermissionError(f"Outside the allowed locations: {path}")
+    # List through a descriptor, so a directory swapped for a link after
+    # the check is not followed.
+    dir_fd = os.open(real_path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    _check_opened(dir_fd, real_path, path, roots)
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_fd) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        files.append([entry.name, entry.stat(follow_symlinks=False).st_size])
+                except OSError:
+                    continue
+    finally:
+        os.close(dir_fd)
+    return [files, subdirs]
+
+
+OPERATIONS = {"stat": op_stat, "unlink": op_unlink, "shred": op_shred, "listdir": op_listdir}
+
+
+def run_op(op, roots):
+    """Run one operation and return [True, value] or [False, error message]"""
+    try:
+        name, path = op
+        return [True, OPERATIONS[name](path, roots)]
+    except (OSError, KeyError, ValueError, TypeError) as e:
+        return [False, str(e)]
+
+
+def _send(outfile, response):
+    """Write one response line"""
+    outfile.write(json.dumps(response).encode("utf-8") + b"\n")
+    outfile.flush()
+
+
+def serve(infile, outfile, roots):
+    """Answer requests from infile until it is closed
+
+    A malformed request gets a reply with an error instead of stopping the
+    helper.
+    """
+    for line in infile:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            ops = request["ops"]
+            if not isinstance(ops, list):
+                raise TypeError("ops is not a list")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            _send(outfile, {"id": request_id, "error": f"Invalid request: {e!r}", "done": True})
+            continue
+        for start in range(0, max(len(ops), 1), CHUNK_SIZE):
+            results = [run_op(op, roots) for op in ops[start:start + CHUNK_SIZE]]
+            _send(outfile, {"id": request_id, "results": results, "done": start + CHUNK_SIZE >= len(ops)})
+
+
+def is_root_owned(path):
+    """Return True if only root can change a file and every directory above it
+
+    Each must be owned by root and not writable by group or others.
+    """
+    path = os.path.realpath(path)
+    while True:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_uid != 0 or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+        parent = os.path.dirname(path)
+        if parent == path:
+            return True
+        path = parent
+
+
+class HelperClient:
+    """Start the helper and send it batches of operations
+
+    With privileged=True and when not already root, the installed helper
+    is started through pkexec, which asks for the administrator password.
+    Raises HelperError if the helper or interpreter is not root-owned.
+    """
+
+    def __init__(self, privileged=True, roots=None):
+        if privileged and os.geteuid() != 0:
+            for path in (SYSTEM_PYTHON, INSTALLED_HELPER):
+                if not is_root_owned(path):
+                    raise HelperError(f"{path} is missing or not owned by root")
+            command = ["pkexec", SYSTEM_PYTHON, "-I", INSTALLED_HELPER]
+        else:
+            command = [sys.executable, "-I", os.path.abspath(__file__)]
+        for root in roots or ():
+            command += ["--root", root]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.lock = threading.Lock()
+        self.last_id = 0
+
+    def request(self, ops):
+        """Send a batch of operations and yield one result per operation, in order
+
+        Each result is [True, value] or [False, error message]. Results
+        stream in as the helper finishes each chunk.
+        """
+        with self.lock:
+            self.last_id += 1
+            request_id = self.last_id
+            try:
+                self.process.stdin.write(json.dumps({"id": request_id, "ops": ops}).encode("utf-8") + b"\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                raise HelperError(f"The helper is not running: {e}") from None
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    raise HelperError("The helper exited")
+                response = json.loads(line)
+                # Skip the rest of an earlier request that was not read to the end.
+                if response.get("id") != request_id:
+                    continue
+                if "error" in response:
+                    raise HelperError(response["error"])
+                yield from response["results"]
+                if response["done"]:
+                    return
+
+    def walk(self, root):
+        """Yield (path, size) for every file below root, listing one level per request"""
+        dirpaths = [root]
+        while dirpaths:
+            next_dirpaths = []
+            for dirpath, (ok, value) in zip(dirpaths, self.request([["listdir", d] for d in dirpaths])):
+                if not ok:
+                    continue
+                files, subdirs = value
+                for name, size in files:
+                    yield os.path.join(dirpath, name), size
+                next_dirpaths.extend(os.path.join(dirpath, name) for name in subdirs)
+            dirpaths = next_dirpaths
+
+    def close(self):
+        """Stop the helper"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Privileged helper for BleachBit")
+    parser.add_argument("--root", action="append", default=[],
+                        help="allowed location, only when not running as root (for testing)")
+    args = parser.parse_args()
+    if args.root and os.geteuid() == 0:
+        parser.error("--root is not allowed when running as root")
+    roots = [os.path.realpath(root) for root in args.root or ALLOWED_ROOTS]
+    serve(sys.stdin.buffer, sys.stdout.buffer, roots)
+
+
+if __name__ == "__main__":
+    main()
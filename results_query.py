@@ -0,0 +1,274 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Query syntax for the results search box
+
+A query is a list of terms separated by spaces. A row must match every
+term. Examples:
+
+    firefox                 cleaner, option or path contains "firefox"
+    cleaner:firefox         cleaner contains "firefox"
+    path:*.log              whole path matches the wildcard pattern
+                            (* and ? are wildcards; [ and ] are literal)
+    size>1GB                size comparison with <, <=, >, >=, or =
+    action:error            action is exactly "error"; action:none is empty
+    -cache                  a leading minus negates a term
+    "two words"             quotes keep spaces in a term
+
+Text matching ignores case. A query is compiled once. It is then
+evaluated over whole columns of a ResultsTable, or translated to SQL for
+results kept on disk. Column masks are NumPy arrays when NumPy is
+installed. Otherwise they are lists built by map() over C functions, so
+no Python code runs per row.
+"""
+
+# standard library imports
+import itertools
+import operator
+import re
+import shlex
+
+# local imports
+from results_table import COLUMN_ACTION, COLUMN_CLEANER, COLUMN_OPTION, COLUMN_PATH, COLUMN_SIZE, numpy
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+
+SIZE_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+                  "=": operator.eq}
+
+TEXT_FIELDS = {"cleaner": COLUMN_CLEANER, "option": COLUMN_OPTION, "path": COLUMN_PATH}
+
+SQL_COLUMNS = {COLUMN_CLEANER: "cleaner", COLUMN_OPTION: "option", COLUMN_PATH: "path"}
+
+_SIZE_RE = re.compile(r"size:?(<=|>=|<|>|=)?([0-9]+(?:\.[0-9]+)?)([a-z]*)", re.IGNORECASE)
+
+
+class QueryError(ValueError):
+    """The search text is not a valid query"""
+
+
+def _lookup(match_by_code, snapshot, column):
+    """Return a mask from a per-code match list over an interned column"""
+    if numpy is not None:
+        return numpy.array(match_by_code, dtype=bool)[snapshot.column_array(column)]
+    return list(map(match_by_code.__getitem__, snapshot.codes[column]))
+
+
+def _glob_regex(text):
+    """Return a regular expression for a pattern where only * and ? are wildcards
+
+    Unlike fnmatch, brackets are not character classes, because SQL LIKE
+    has no equivalent and paths often contain brackets.
+    """
+    parts = [".*" if char == "*" else "." if char == "?" else re.escape(char) for char in text]
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+def _like_pattern(text, is_glob):
+    """Return a pattern for SQL LIKE with backslash as the escape character"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if is_glob:
+        return escaped.replace("*", "%").replace("?", "_")
+    return "%" + escaped + "%"
+
+
+class TextTerm:
+    """Substring or wildcard match against one or more text columns"""
+
+    def __init__(self, columns, text):
+        self.columns = columns
+        self.text = text.casefold()
+        self.is_glob = "*" in text or "?" in text
+        if self.is_glob:
+            self.regex = _glob_regex(self.text)
+
+    def match_text(self, value):
+        """Return True if one value matches"""
+        value = value.casefold()
+        if self.is_glob:
+            return self.regex.match(value) is not None
+        return self.text in value
+
+    def match_row(self, row):
+        return any(self.match_text(row[column]) for column in self.columns)
+
+    def column_mask(self, snapshot, column):
+        """Return a mask for one column"""
+        if column == COLUMN_PATH:
+            keys = snapshot.path_keys
+            if self.is_glob:
+                mask = list(map(bool, map(self.regex.match, keys)))
+            else:
+                mask = list(map(str.__contains__, keys, itertools.repeat(self.text)))
+            return numpy.array(mask, dtype=bool) if numpy is not None else mask
+        # Names are interned, so test each distinct name once and look up
+        # the result by code.
+        interner = snapshot.interners[column]
+        return _lookup([self.match_text(name) for name in interner.names], snapshot, column)
+
+    def mask(self, snapshot):
+        masks = [self.column_mask(snapshot, column) for column in self.columns]
+        if len(masks) == 1:
+            return masks[0]
+        if numpy is not None:
+            return numpy.logical_or.reduce(masks)
+        return list(map(any, zip(*masks)))
+
+    def sql(self):
+        pattern = _like_pattern(self.text, self.is_glob)
+        clauses = [f"{SQL_COLUMNS[column]} LIKE ? ESCAPE '\\'" for column in self.columns]
+        return "(" + " OR ".join(clauses) + ")", [pattern] * len(clauses)
+
+
+class SizeTerm:
+    """Numeric comparison against the size column"""
+
+    def __init__(self, symbol, size):
+        self.symbol = symbol
+        self.compare = SIZE_OPERATORS[symbol]
+        self.size = size
+
+    def match_row(self, row):
+        return self.compare(row[COLUMN_SIZE], self.size)
+
+    def mask(self, snapshot):
+        if numpy is not None:
+            return self.compare(snapshot.column_array(COLUMN_SIZE), self.size)
+        return list(map(self.compare, snapshot.sizes, itertools.repeat(self.size)))
+
+    def sql(self):
+        return f"size {self.symbol} ?", [self.size]
+
+
+class ActionTerm:
+    """Exact match against the action column, which holds a few fixed values"""
+
+    def __init__(self, action):
+        self.action = "" if action.lower() == "none" else action.lower()
+
+    def match_row(self, row):
+        return row[COLUMN_ACTION].lower() == self.action
+
+    def mask(self, snapshot):
+        interner = snapshot.interners[COLUMN_ACTION]
+        return _lookup([name.lower() == self.action for name in interner.names], snapshot, COLUMN_ACTION)
+
+    def sql(self):
+        return "action = ? COLLATE NOCASE", [self.action]
+
+
+class NotTerm:
+    """Negation of another term"""
+
+    def __init__(self, term):
+        self.term = term
+
+    def match_row(self, row):
+        return not self.term.match_row(row)
+
+    def mask(self, snapshot):
+        if numpy is not None:
+            return numpy.logical_not(self.term.mask(snapshot))
+        return list(map(operator.not_, self.term.mask(snapshot)))
+
+    def sql(self):
+        clause, params = self.term.sql()
+        return f"NOT {clause}", params
+
+
+class Query:
+    """A compiled query: all terms must match"""
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def match_row(self, row):
+        """Return True if a row [cleaner, option, path, size, action] matches"""
+        return all(term.match_row(row) for term in self.terms)
+
+    def mask(self, table):
+        """Return booleans indexed by row id for every row in the table
+
+        Rows appended while the mask is computed are not included.
+        """
+        snapshot = table.snapshot()
+        if numpy is not None:
+            mask = numpy.ones(snapshot.n_rows, dtype=bool)
+            for term in self.terms:
+                mask &= term.mask(snapshot)
+            return mask
+        mask = [True] * snapshot.n_rows
+        for term in self.terms:
+            mask = list(map(operator.and_, mask, term.mask(snapshot)))
+        return mask
+
+    def sql(self):
+        """Return (WHERE clause, parameters) for the spill database"""
+        if not self.terms:
+            return "", ()
+        clauses = []
+        params = []
+        for term in self.terms:
+            clause, term_params = term.sql()
+            clauses.append(clause)
+            params.extend(term_params)
+        return "WHERE " + " AND ".join(clauses), tuple(params)
+
+
+def parse_size(number, unit):
+    """Return a size in bytes from a number and a unit such as KB or GB"""
+    try:
+        return int(float(number) * SIZE_UNITS[unit.lower()])
+    except KeyError:
+        raise QueryError(f"Unknown size unit: {unit}") from None
+
+
+def parse_term(token):
+    """Return the term for one token of the query"""
+    if token.startswith("-") and len(token) > 1:
+        return NotTerm(parse_term(token[1:]))
+    match = _SIZE_RE.fullmatch(token)
+    if match:
+        symbol, number, unit = match.groups()
+        return SizeTerm(symbol or "=", parse_size(number, unit))
+    if token.lower().startswith("size") and token[4:5] in (":", "<", ">", "="):
+        raise QueryError(f"Invalid size comparison: {token}")
+    field, separator, value = token.partition(":")
+    if separator and value:
+        if field.lower() in TEXT_FIELDS:
+            return TextTerm((TEXT_FIELDS[field.lower()],), value)
+        if field.lower() == "action":
+            return ActionTerm(value)
+    # Anything else, including text with an unknown prefix such as a URL,
+    # is searched for in the cleaner, option and path.
+    return TextTerm((COLUMN_CLEANER, COLUMN_OPTION, COLUMN_PATH), token)
+
+
+def compile_query(text):
+    """Parse the search text into a Query, raising QueryError if it is invalid"""
+    try:
+        tokens = shlex.split(text or "")
+    except ValueError as e:
+        raise QueryError(str(e)) from None
+    return Query([parse_term(token) for token in tokens])
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Disk-backed store for results that exceed the memory budget
+
+When a preview produces more rows than fit in the memory budget, the rows
+move into a temporary SQLite database. The TreeView then shows one page at
+a time, and searching and sorting become indexed queries. SQLite's page
+cache is capped, so memory use stays flat however many rows there are.
+
+Pages are found by key (keyset pagination) rather than by OFFSET, so the
+last page costs no more than the first. Queries for pages run on a
+separate connection, which can be interrupted when a newer query
+supersedes them without disturbing inserts.
+"""
+
+# standard library imports
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Number of rows shown at a time in the TreeView.
+PAGE_SIZE = 10000
+
+# Rows are inserted in batches of this size.
+INSERT_BATCH_SIZE = 10000
+
+# Upper limit on SQLite's page cache, in KiB.
+CACHE_SIZE_KIB = 16 * 1024
+
+COLUMN_NAMES = ("cleaner", "option", "path", "size", "action")
+
+
+def below_where(dirpath):
+    """Return (WHERE clause, parameters) for the paths below a directory
+
+    The range on path lets SQLite search the path index. The index ignores
+    case, so the exact prefix is checked as well.
+    """
+    prefix = os.path.join(dirpath, "")
+    # Every path starting with prefix sorts before this bound.
+    bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return ("WHERE path COLLATE NOCASE >= ? AND path COLLATE NOCASE < ? AND substr(path, 1, ?) = ?",
+            (prefix, bound, len(prefix), prefix))
+
+
+class SpillStore:
+    """Results kept in a temporary SQLite database
+
+    The writing connection is used by the worker thread that appends rows
+    and by deletions; the reading connection by the threads that query
+    pages. Each connection has its own lock.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.db_path = tempfile.mkstemp(prefix="bleachbit-results-", suffix=".sqlite", dir=directory)
+        os.close(fd)
+        self.lock = threading.Lock()
+        self.pending = []
+        self.indexed = False
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute("PRAGMA temp_store=FILE")
+        self.connection.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        self.connection.execute(
+            "CREATE TABLE results (cleaner TEXT, option TEXT, path TEXT, size INTEGER, action TEXT)")
+        self.connection.commit()
+        self.read_lock = threading.Lock()
+        self.reader = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.reader.execute("PRAGMA temp_store=FILE")
+        self.reader.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        # Row counts by WHERE clause, until the rows change.
+        self.counts = {}
+
+    def append(self, row):
+        """Queue a row [cleaner, option, path, size, action] for insertion"""
+        self.pending.append(row)
+        if len(self.pending) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def extend(self, rows):
+        """Queue many rows for insertion"""
+        self.pending.extend(rows)
+        if len(self.pending) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Insert the queued rows"""
+        rows, self.pending = self.pending, []
+        if rows:
+            self.counts.clear()
+            with self.lock:
+                self.connection.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?)", rows)
+                self.connection.commit()
+
+    def finish(self):
+        """Insert the queued rows and build the indexes
+
+        Building the indexes once after a bulk insert is much faster than
+        maintaining them row by row.
+        """
+        self.flush()
+        if self.indexed:
+            return
+        with self.lock:
+            self.connection.execute("CREATE INDEX results_cleaner ON results (cleaner COLLATE NOCASE)")
+            self.connection.execute("CREATE INDEX results_option ON results (option COLLATE NOCASE)")
+            self.connection.execute("CREATE INDEX results_size ON results (size)")
+            self.connection.execute("CREATE INDEX results_path ON results (path COLLATE NOCASE)")
+            self.connection.execute("CREATE INDEX results_action ON results (action COLLATE NOCASE)")
+            self.connection.commit()
+        self.indexed = True
+
+    def count(self, where="", params=()):
+        """Return the number of rows matching a WHERE clause
+
+        Counting scans every matching row, so the result is kept until the
+        rows change.
+        """
+        key = (where, tuple(params))
+        count = self.counts.get(key)
+        if count is None:
+            with self.read_lock:
+                count = self.reader.execute(f"SELECT COUNT(*) FROM results {where}", params).fetchone()[0]
+            self.counts[key] = count
+        return count
+
+    def page(self, limit, where="", params=(), sort=None, after=None, before=None, inclusive=False):
+        """Return (rows, keys) for up to limit rows matching a WHERE clause
+
+        sort is None or (column number, descending). Rows with equal sort
+        keys keep their insertion order. keys holds one (sort value,
+        rowid) per row. Pass the last key of a page as after to get the
+        next page, or the first key as before to get the previous one.
+        With inclusive, the row with that key itself is included.
+        """
+        column_id, descending = sort if sort is not None else (None, False)
+        backwards = before is not None
+        key = before if backwards else after
+        # The direction rows are read in; a previous page is read backwards.
+        reverse = descending != backwards
+        direction = "DESC" if reverse else "ASC"
+        compare = "<" if reverse else ">"
+        rowid_compare = compare + ("=" if inclusive else "")
+        conditions = [where[len("WHERE "):]] if where else []
+        params = list(params)
+        with self.read_lock:
+            if column_id is None:
+                if key is not None:
+                    conditions.append(f"rowid {rowid_compare} ?")
+                    params.append(key[1])
+                rows = self._select(conditions, params, f"rowid {direction}", limit)
+            else:
+                collate = " COLLATE NOCASE" if column_id != 3 else ""
+                column = f"{COLUMN_NAMES[column_id]}{collate}"
+                order = f"{column} {direction}, rowid {direction}"
+                if key is None:
+                    rows = self._select(conditions, params, order, limit)
+                else:
+                    # First the rows tied with the key, then the rows beyond
+                    # it. Each part is one seek in the column's index.
+                    rows = self._select(conditions + [f"{column} = ?", f"rowid {rowid_compare} ?"],
+                                        params + [key[0], key[1]], f"rowid {direction}", limit)
+                    if len(rows) < limit:
+                        rows += self._select(conditions + [f"{column} {compare} ?"], params + [key[0]],
+                                             order, limit - len(rows))
+        if backwards:
+            rows.reverse()
+        keys = [(row[column_id + 1] if column_id is not None else None, row[0]) for row in rows]
+        return [list(row[1:]) for row in rows], keys
+
+    def _select(self, conditions, params, order, limit):
+        """Return rows with their rowid; the caller holds read_lock"""
+        clause = "WHERE " + " AND ".join(f"({condition})" for condition in conditions) if conditions else ""
+        return self.reader.execute(
+            f"SELECT rowid, cleaner, option, path, size, action FROM results {clause} ORDER BY {order} LIMIT ?",
+            params + [limit]).fetchall()
+
+    def interrupt(self):
+        """Stop a page or count query running on the reading connection"""
+        self.reader.interrupt()
+
+    def delete(self, where="", params=(), on_paths=None):
+        """Delete the rows matching a WHERE clause and return how many there were
+
+        on_paths, if given, is called first with an iterator over the paths
+        of those rows, so they can be consumed without building a list.
+        """
+        self.counts.clear()
+        with self.lock:
+            if on_paths is not None:
+                on_paths(row[0] for row in self.connection.execute(f"SELECT path FROM results {where}", params))
+            count = self.connection.execute(f"DELETE FROM results {where}", params).rowcount
+            self.connection.commit()
+        return count
+
+    def delete_paths(self, paths):
+        """Delete the rows with the given paths in one transaction"""
+        # The NOCASE comparison lets SQLite use the path index, and the
+        # exact comparison keeps paths that differ only in case.
+        self.counts.clear()
+        with self.lock:
+            self.connection.executemany(
+                "DELETE FROM results WHERE path = ? COLLATE NOCASE AND path = ?", ((path, path) for path in paths))
+            self.connection.commit()
+
+    def close(self):
+        """Close the database and delete its file"""
+        self.interrupt()
+        with self.read_lock:
+            self.reader.close()
+        with self.lock:
+            self.connection.close()
+        try:
+            os.remove(self.db_path)
+        except OSError:
+            pass
+
@@ -0,0 +1,551 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Column-oriented copy of the file results
+
+The ListStore shown by the TreeView is good at drawing rows but slow at
+comparing them, because a TreeModelSort calls back through GObject for
+every pair of rows. This table keeps the same results as plain columns,
+with cleaner, option and action names interned to small integer codes and
+the path pre-casefolded, so the results can be sorted on precomputed keys.
+
+Rows get a permanent id when appended. view_order maps a position in the
+ListStore to the id of the row shown there.
+
+RangeSelection keeps the TreeView selection as ranges of positions, so
+selecting a million rows does not allocate a million TreePaths.
+
+NumPy is optional. Without it, sorting falls back to the built-in sort.
+"""
+
+# standard library imports
+import bisect
+import collections
+import itertools
+import operator
+import os
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMN_CLEANER = 0
+COLUMN_OPTION = 1
+COLUMN_PATH = 2
+COLUMN_SIZE = 3
+COLUMN_ACTION = 4
+
+# Rough cost in bytes of one row in this table and in the ListStore,
+# not counting the characters of the path.
+ROW_MEMORY_BYTES = 400
+
+# Largest NumPy string array, in bytes, to build for sorting by path.
+# NumPy strings are fixed width, so one long path widens every row.
+PATH_SORT_MAX_BYTES = 512 * 1024 * 1024
+
+
+SortedOrder = collections.namedtuple("SortedOrder", "version ids new_order id_array")
+SortedOrder.__doc__ = """Row ids in a new order, with the list for Gtk.ListStore.reorder()
+
+id_array holds the same ids as a NumPy array, or None without NumPy.
+"""
+
+
+class Interner:
+    """Map repeated strings to small integer codes"""
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, name):
+        """Return the code for a name, assigning one if needed"""
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def code_list(self, names):
+        """Return the codes for many names, assigning new ones as needed"""
+        names = list(names)
+        for name in set(names).difference(self.codes):
+            self.code(name)
+        return list(map(self.codes.__getitem__, names))
+
+    def ranks(self):
+        """Return a list mapping each code to its alphabetical rank"""
+        ranks = [0] * len(self.names)
+        for rank, code in enumerate(sorted(range(len(self.names)), key=lambda code: self.names[code].casefold())):
+            ranks[code] = rank
+        return ranks
+
+
+class ResultsTable:
+    """Results stored as parallel columns indexed by row id"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        """Remove all rows"""
+        with self.lock:
+            self.cleaners = Interner()
+            self.options = Interner()
+            self.actions = Interner()
+            self.cleaner_codes = []
+            self.option_codes = []
+            self.paths = []
+            self.path_keys = []
+            self.sizes = []
+            self.action_codes = []
+            self.visible = []
+            self.view_order = []
+            # Keep counting, so positions from before the clear are stale.
+            self.version += 1
+            self.memory_estimate = 0
+            self._path_order = None
+            self._arrays = {}
+            self._size_orders = {}
+            self._view_array = None
+
+    def __len__(self):
+        return len(self.view_order)
+
+    def append(self, row, visible=True):
+        """Append a row [cleaner, option, path, size, action] and return its id"""
+        cleaner_name, option_name, path, size, action = row
+        with self.lock:
+            row_id = len(self.paths)
+            self.cleaner_codes.append(self.cleaners.code(cleaner_name))
+            self.option_codes.append(self.options.code(option_name))
+            self.paths.append(path)
+            self.path_keys.append(path.casefold())
+            self.sizes.append(size)
+            self.action_codes.append(self.actions.code(action))
+            self.visible.append(visible)
+            self.view_order.append(row_id)
+            self.version += 1
+            # The path is stored twice: as given and casefolded.
+            self.memory_estimate += ROW_MEMORY_BYTES + 2 * len(path)
+        return row_id
+
+    def extend(self, rows, match_rows=None):
+        """Append many rows under one lock and return the id of the first
+
+        This is the bulk form of append() for rows replayed from the scan
+        cache. match_rows returns the visibility of the rows. It is called
+        under the lock, so a search started meanwhile either includes the
+        rows in its mask or had already changed the query match_rows uses.
+        """
+        paths = list(map(operator.itemgetter(COLUMN_PATH), rows))
+        with self.lock:
+            visible = match_rows(rows) if match_rows else [True] * len(rows)
+            first_id = len(self.paths)
+            self.cleaner_codes.extend(self.cleaners.code_list(map(operator.itemgetter(COLUMN_CLEANER), rows)))
+            self.option_codes.extend(self.options.code_list(map(operator.itemgetter(COLUMN_OPTION), rows)))
+            self.paths.extend(paths)
+            self.path_keys.extend(map(str.casefold, paths))
+            self.sizes.extend(map(operator.itemgetter(COLUMN_SIZE), rows))
+            self.action_codes.extend(self.actions.code_list(map(operator.itemgetter(COLUMN_ACTION), rows)))
+            self.visible.extend(visible)
+            self.view_order.extend(range(first_id, first_id + len(rows)))
+            self.version += 1
+            self.memory_estimate += ROW_MEMORY_BYTES * len(rows) + 2 * sum(map(len, paths))
+        return first_id
+
+    def remove_at(self, position):
+        """Remove the row shown at a ListStore position and return its id"""
+        with self.lock:
+            self.version += 1
+            return self.view_order.pop(position)
+
+    def set_size(self, position, size):
+        """Update the size of the row shown at a ListStore position"""
+        with self.lock:
+            self.sizes[self.view_order[position]] = size
+            self.version += 1
+            self._arrays.pop(COLUMN_SIZE, None)
+            self._size_orders.clear()
+
+    def interned_column(self, column):
+        """Return (interner, codes) for the cleaner, option or action column"""
+        return {
+            COLUMN_CLEANER: (self.cleaners, self.cleaner_codes),
+            COLUMN_OPTION: (self.options, self.option_codes),
+            COLUMN_ACTION: (self.actions, self.action_codes),
+        }[column]
+
+    def column_array(self, column, n_rows):
+        """Return a NumPy array of the size or code column for the first n_rows ids
+
+        The array is cached until rows are appended or a size changes. It is
+        shorter than n_rows if the table was cleared since n_rows was read,
+        and then it is not cached.
+        """
+        with self.lock:
+            cached = self._arrays.get(column)
+            if cached is not None and cached[0] == n_rows:
+                return cached[1]
+            if column == COLUMN_SIZE:
+                values = self.sizes
+            else:
+                values = self.interned_column(column)[1]
+            array = numpy.array(values[:n_rows], dtype=numpy.int64)
+            if len(array) == n_rows:
+                self._arrays[column] = (n_rows, array)
+        return array
+
+    def snapshot(self):
+        """Return a TableSnapshot of the rows appended so far"""
+        with self.lock:
+            return TableSnapshot(self)
+
+    def apply_mask(self, mask):
+        """Set which rows match the search, given booleans indexed by row id
+
+        Returns a list of (position, visible) for the rows whose visibility
+        changed, so only those need updating in the ListStore. Rows appended
+        after the mask was computed keep their visibility.
+        """
+        n_rows = len(mask)
+        with self.lock:
+            visible = self.visible
+            if numpy is not None:
+                view = self._view_array_locked()
+                positions = numpy.nonzero(view < n_rows)[0]
+                row_ids = view[positions]
+                new = numpy.asarray(mask, dtype=bool)[row_ids]
+                old = numpy.array(visible[:n_rows], dtype=bool)[row_ids]
+                changed = numpy.nonzero(new != old)[0]
+                changes = list(zip(positions[changed].tolist(), new[changed].tolist()))
+                mask = numpy.asarray(mask, dtype=bool).tolist()
+            else:
+                changes = [(position, mask[row_id]) for position, row_id in enumerate(self.view_order)
+                           if row_id < n_rows and visible[row_id] != mask[row_id]]
+            self.visible = list(mask) + visible[n_rows:]
+        return changes
+
+    def visible_ids(self):
+        """Return the ids of the rows matching the search, in view order
+
+        Position k in the filtered TreeView shows the row with id
+        visible_ids()[k].
+        """
+        with self.lock:
+            if numpy is not None:
+                view = self._view_array_locked()
+                return view[numpy.array(self.visible, dtype=bool)[view]]
+            visible = self.visible
+            return [row_id for row_id in self.view_order if visible[row_id]]
+
+    def ids_below(self, dirpath):
+        """Return the ids of the rows with paths below a directory, in view order"""
+        prefix = os.path.join(dirpath, "")
+        with self.lock:
+            below = list(map(str.startswith, self.paths, itertools.repeat(prefix)))
+            if numpy is not None:
+                view = self._view_array_locked()
+                return view[numpy.array(below, dtype=bool)[view]]
+            return [row_id for row_id in self.view_order if below[row_id]]
+
+    def remove_ids(self, row_ids):
+        """Remove many rows at once by id
+
+        Returns the ListStore positions they were shown at, from last to
+        first, so they can be removed from the ListStore in that order.
+        """
+        with self.lock:
+            if numpy is not None:
+                keep = numpy.ones(len(self.paths), dtype=bool)
+                keep[numpy.asarray(row_ids, dtype=numpy.int64)] = False
+                view = self._view_array_locked()
+                kept = keep[view]
+                positions = numpy.nonzero(~kept)[0][::-1].tolist()
+                self.view_order = view[kept].tolist()
+            else:
+                removed = set(row_ids)
+                positions = [position for position, row_id in enumerate(self.view_order) if row_id in removed]
+                positions.reverse()
+                self.view_order = [row_id for row_id in self.view_order if row_id not in removed]
+            self.version += 1
+        return positions
+
+    def row_batches(self, batch_size):
+        """Yield the rows in view order, in lists of up to batch_size
+
+        Only one batch of rows is built at a time.
+        """
+        with self.lock:
+            view_order = self.view_order[:]
+        for start in range(0, len(view_order), batch_size):
+            yield list(map(self.row, view_order[start:start + batch_size]))
+
+    def row(self, row_id):
+        """Return a row as a list suitable for the ListStore"""
+        return [self.cleaners.names[self.cleaner_codes[row_id]],
+                self.options.names[self.option_codes[row_id]],
+                self.paths[row_id],
+                self.sizes[row_id],
+                self.actions.names[self.action_codes[row_id]]]
+
+    def path_order(self, n_rows):
+        """Return the first n_rows ids ordered by casefolded path
+
+        The order is cached until rows are appended, so switching between
+        other columns only sorts integers. With NumPy, the paths are sorted
+        as a string array, unless the array would be too large.
+        """
+        cached = self._path_order
+        if cached is not None and cached[0] == n_rows:
+            return cached[1]
+        path_keys = self.path_keys[:n_rows]
+        if numpy is None:
+            order = sorted(range(n_rows), key=path_keys.__getitem__)
+        elif n_rows and n_rows * max(map(len, path_keys)) * 4 > PATH_SORT_MAX_BYTES:
+            order = numpy.array(sorted(range(n_rows), key=path_keys.__getitem__), dtype=numpy.int64)
+        else:
+            # A stable sort keeps rows with the same path in id order.
+            order = numpy.argsort(numpy.array(path_keys, dtype=str), kind="stable").astype(numpy.int64)
+        self._path_order = (n_rows, order)
+        return order
+
+    def _primary_key(self, column, n_rows):
+        """Return a per-row-id sort key for a column other than the path
+
+        With NumPy, the key is built from the cached column arrays, so
+        switching columns does not convert lists again.
+        """
+        if numpy is not None:
+            array = self.column_array(column, n_rows)
+            if column == COLUMN_SIZE:
+                return array
+            ranks = self.interned_column(column)[0].ranks()
+            return numpy.array(ranks, dtype=numpy.int64)[array]
+        if column == COLUMN_SIZE:
+            return self.sizes[:]
+        interner, codes = self.interned_column(column)
+        ranks = interner.ranks()
+        return [ranks[code] for code in codes[:]]
+
+    def column_order(self, column, descending, n_rows):
+        """Return the first n_rows ids ordered by a column other than the path (NumPy only)
+
+        Ties are broken by ascending path. Codes are narrowed to 8 or 16
+        bits, which NumPy sorts by radix. The slower size orders are cached
+        until rows are appended or a size changes.
+        """
+        cached = self._size_orders.get(descending) if column == COLUMN_SIZE else None
+        if cached is not None and cached[0] == n_rows:
+            return cached[1]
+        path_order = self.path_order(n_rows)
+        primary = self._primary_key(column, n_rows)[path_order]
+        if descending:
+            primary = primary.max(initial=0) - primary
+        else:
+            primary = primary - primary.min(initial=0)
+        primary = primary.astype(numpy.min_scalar_type(primary.max(initial=0)))
+        # A stable sort keeps rows with equal keys in path order.
+        order = path_order[numpy.argsort(primary, kind="stable")]
+        if column == COLUMN_SIZE:
+            with self.lock:
+                self._size_orders[descending] = (n_rows, order)
+        return order
+
+    def _view_array_locked(self):
+        """Return view_order as a NumPy array, cached until the table changes
+
+        Call with the lock held.
+        """
+        cached = self._view_array
+        if cached is None or cached[0] != self.version:
+            cached = self._view_array = (self.version, numpy.array(self.view_order, dtype=numpy.int64))
+        return cached[1]
+
+    def sort_order(self, column, descending=False):
+        """Return a SortedOrder with the rows ordered by a column
+
+        Ties are broken by ascending path. The new order is the list for
+        Gtk.ListStore.reorder(): the old position of the row at each new
+        position. This may run in a background thread; pass the result to
+        apply_order().
+        """
+        with self.lock:
+            n_rows = len(self.paths)
+            version = self.version
+            if numpy is not None:
+                view = self._view_array_locked()
+            else:
+                view_order = self.view_order[:]
+        if numpy is not None:
+            path_order = self.path_order(n_rows)
+            old_position = numpy.zeros(n_rows, dtype=numpy.int64)
+            old_position[view] = numpy.arange(len(view))
+            if column == COLUMN_PATH:
+                ids = path_order[::-1] if descending else path_order
+            else:
+                ids = self.column_order(column, descending, n_rows)
+            if len(view) < n_rows:
+                visible = numpy.zeros(n_rows, dtype=bool)
+                visible[view] = True
+                ids = ids[visible[ids]]
+            return SortedOrder(version, ids.tolist(), old_position[ids].tolist(), ids)
+        path_order = self.path_order(n_rows)
+        if len(view_order) < n_rows:
+            visible = set(view_order)
+            ids = [row_id for row_id in path_order if row_id in visible]
+        else:
+            ids = path_order
+        if column == COLUMN_PATH:
+            ids = ids[::-1] if descending else ids[:]
+        else:
+            # The sort is stable, so rows with equal keys stay in path order.
+            ids = sorted(ids, key=self._primary_key(column, n_rows).__getitem__, reverse=descending)
+        old_position = [0] * n_rows
+        for position, row_id in enumerate(view_order):
+            old_position[row_id] = position
+        return SortedOrder(version, ids, [old_position[row_id] for row_id in ids], None)
+
+    def apply_order(self, order):
+        """Make the row ids of a SortedOrder the new view order
+
+        Returns False if the table changed since sort_order(), in which case
+        the order is stale.
+        """
+        with self.lock:
+            if order.version != self.version:
+                return False
+            self.view_order = order.ids
+            self.version += 1
+            if order.id_array is not None:
+                self._view_array = (self.version, order.id_array)
+        return True
+
+
+class TableSnapshot:
+    """The columns of a ResultsTable up to one row count, for searching
+
+    It is built under the table's lock, so every column has n_rows values
+    even while another thread appends rows.
+    """
+
+    def __init__(self, table):
+        n_rows = self.n_rows = len(table.paths)
+        self.table = table
+        self.path_keys = table.path_keys[:n_rows]
+        self.sizes = table.sizes[:n_rows]
+        self.interners = {column: table.interned_column(column)[0]
+                          for column in (COLUMN_CLEANER, COLUMN_OPTION, COLUMN_ACTION)}
+        self.codes = {column: table.interned_column(column)[1][:n_rows]
+                      for column in (COLUMN_CLEANER, COLUMN_OPTION, COLUMN_ACTION)}
+
+    def column_array(self, column):
+        """Return a NumPy array of the size or code column"""
+        array = self.table.column_array(column, self.n_rows)
+        if len(array) != self.n_rows:
+            # The table was cleared since the snapshot.
+            array = numpy.array(self.sizes if column == COLUMN_SIZE else self.codes[column], dtype=numpy.int64)
+        return array
+
+
+class RangeSelection:
+    """Selected positions kept as sorted, disjoint [start, stop) ranges
+
+    version records the ResultsTable version the positions refer to, so a
+    selection made before the rows were reordered is not trusted.
+    """
+
+    def __init__(self):
+        self.ranges = []
+        self.anchor = 0
+        self.version = None
+
+    def __len__(self):
+        return sum(stop - start for start, stop in self.ranges)
+
+    def __contains__(self, position):
+        index = bisect.bisect_right(self.ranges, (position, float("inf"))) - 1
+        return index >= 0 and self.ranges[index][1] > position
+
+    def clear(self):
+        """Select nothing"""
+        self.ranges = []
+
+    def select_all(self, count):
+        """Select positions 0 to count - 1"""
+        self.ranges = [(0, count)] if count else []
+
+    def select_only(self, position):
+        """Select one position and make it the anchor for select_to()"""
+        self.ranges = [(position, position + 1)]
+        self.anchor = position
+
+    def select_to(self, position, extend=False):
+        """Select from the anchor to a position, like a shift-click
+
+        With extend, the range is added to the selection instead of
+        replacing it.
+        """
+        start, stop = min(self.anchor, position), max(self.anchor, position) + 1
+        self.ranges = self._merge(self.ranges + [(start, stop)]) if extend else [(start, stop)]
+
+    def toggle(self, position):
+        """Select or unselect one position, like a control-click"""
+        self.anchor = position
+        if position not in self:
+            self.ranges = self._merge(self.ranges + [(position, position + 1)])
+            return
+        ranges = []
+        for start, stop in self.ranges:
+            if start <= position < stop:
+                if start < position:
+                    ranges.append((start, position))
+                if position + 1 < stop:
+                    ranges.append((position + 1, stop))
+            else:
+                ranges.append((start, stop))
+        self.ranges = ranges
+
+    def set_positions(self, positions):
+        """Select exactly the given positions"""
+        self.ranges = self._merge((position, position + 1) for position in positions)
+
+    def take(self, values):
+        """Return the items of a list or NumPy array at the selected positions"""
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            if not self.ranges:
+                return values[:0]
+            return numpy.concatenate([values[start:stop] for start, stop in self.ranges])
+        return [value for start, stop in self.ranges for value in values[start:stop]]
+
+    @staticmethod
+    def _merge(ranges):
+        """Return ranges sorted with overlapping and adjacent ones joined"""
+        merged = []
+        for start, stop in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        return merged
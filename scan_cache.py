@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Incremental directory scanner backed by a persistent mtime cache
+
+A directory's mtime changes whenever an entry is added, removed, or renamed
+in it, so a directory whose mtime matches the cache does not need to be
+listed again. Re-scanning an unchanged tree costs one stat() per directory
+instead of one scandir() per directory plus one stat() per file.
+
+A file that grows in place does not change its directory's mtime. The
+inotify watcher covers that case while the window is open by calling
+invalidate() for the parent directory.
+
+An entry added in the same timestamp tick as a listing does not change
+the mtime afterwards. As in git's racy-index check, a listing is only
+trusted if the directory's mtime is safely older than the listing.
+
+When the results are spilled to disk, drop_names() keeps only the
+summary and subdirectories of each directory in memory, so the cache does
+not grow with the number of files; those directories are listed again by
+the next walk.
+
+The cache holds file names from private locations, so the file is only
+readable by the user, and clear() deletes it when cleaning.
+
+The cache file is read in a background thread, so a large cache does not
+delay opening the window; walk() waits for it.
+"""
+
+# standard library imports
+import json
+import os
+import threading
+import time
+
+CACHE_VERSION = 2
+
+# A listing is trusted only if the directory's mtime is older than the
+# listing by this much, which covers coarse file system timestamps.
+RACY_MTIME_NS = 2 * 1000 ** 3
+
+
+def default_cache_path():
+    """Return the path of the cache file in the user's cache directory"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "bleachbit", "scan_cache.json")
+
+
+def _without_names(entry):
+    """Return a cache entry without the names and sizes of its files"""
+    return {key: value for key, value in entry.items() if key not in ("names", "sizes")}
+
+
+class DirectoryScanCache:
+    """Cache of directory listings keyed by directory path
+
+    Each entry holds the directory's mtime (ns), the time it was listed
+    (ns), its entry count, the total size of its files, and the names and sizes of its files and
+    subdirectories so that an unchanged directory can be replayed without
+    listing it.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or default_cache_path()
+        self.dirs = {}
+        self.invalidated = set()
+        self.modified = False
+        # False after drop_names(), until the next preview sets it again.
+        self.keep_names = True
+        # Guards dirs, which the walking thread changes while save() may
+        # run from another thread. Entries are replaced, never changed in
+        # place, so a shallow copy is a consistent snapshot.
+        self.lock = threading.RLock()
+        self.loaded = threading.Event()
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def load(self):
+        """Load the cache from disk, ignoring a missing or stale file"""
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                with self.lock:
+                    self.dirs = data.get("dirs", {})
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.loaded.set()
+
+    def save(self):
+        """Write the cache to disk if it changed since it was loaded"""
+        if not self.loaded.is_set():
+            return
+        with self.lock:
+            if not self.modified:
+                return
+            data = {"version": CACHE_VERSION, "dirs": dict(self.dirs)}
+            self.modified = False
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.cache_path)
+
+    def clear(self):
+        """Forget every directory and delete the cache file"""
+        self.loaded.wait()
+        with self.lock:
+            self.dirs = {}
+            self.modified = False
+        try:
+            os.remove(self.cache_path)
+        except FileNotFoundError:
+            pass
+
+    def drop_names(self):
+        """Forget the files of every directory, and of those listed later"""
+        with self.lock:
+            self.keep_names = False
+            self.dirs = {dirpath: _without_names(entry) for dirpath, entry in self.dirs.items()}
+
+    def invalidate(self, dirpath):
+        """Force the next scan to list the directory again"""
+        with self.lock:
+            self.invalidated.add(dirpath)
+
+    def summary(self, dirpath):
+        """Return (mtime_ns, entry count, total size) of a cached directory, or None"""
+        entry = self.dirs.get(dirpath)
+        if entry is None:
+            return None
+        return entry["mtime"], entry["count"], entry["size"]
+
+    def _forget(self, dirpath):
+        """Drop a directory and everything below it from the cache"""
+        prefix = os.path.join(dirpath, "")
+        with self.lock:
+            for key in [key for key in self.dirs if key == dirpath or key.startswith(prefix)]:
+                del self.dirs[key]
+            self.modified = True
+
+    def _list_dir(self, dirpath, mtime_ns):
+        """List one directory and store it in the cache"""
+        names = []
+        sizes = []
+        subdirs = []
+        listed_ns = time.time_ns()
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        else:
+                            sizes.append(entry.stat(follow_symlinks=False).st_size)
+                            names.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            self._forget(dirpath)
+            return None
+        old_entry = self.dirs.get(dirpath)
+        if old_entry is not None:
+            for name in set(old_entry["subdirs"]).difference(subdirs):
+                self._forget(os.path.join(dirpath, name))
+        entry = {"mtime": mtime_ns, "listed": listed_ns, "count": len(names) + len(subdirs), "size": sum(sizes),
+                 "names": names, "sizes": sizes, "subdirs": subdirs}
+        with self.lock:
+            self.dirs[dirpath] = entry if self.keep_names else _without_names(entry)
+            self.modified = True
+        return entry
+
+    def walk(self, root, abort_event=None):
+        """Yield (directory path, entry, cached) for every directory below root
+
+        The entry holds the names and sizes of the files directly in the
+        directory. Only directories whose mtime changed, or which were
+        invalidated, are listed again; the rest are replayed from the cache
+        with cached True, and the same entry object as the previous walk.
+        """
+        self.loaded.wait()
+        root = os.path.abspath(os.path.expanduser(root))
+        stack = [root]
+        while stack:
+            if abort_event is not None and abort_event.is_set():
+                return
+            dirpath = stack.pop()
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                if dirpath in self.dirs:
+                    self._forget(dirpath)
+                continue
+            with self.lock:
+                invalidated = dirpath in self.invalidated
+                self.invalidated.discard(dirpath)
+            entry = self.dirs.get(dirpath)
+            cached = not (entry is None or invalidated or entry["mtime"] != mtime_ns
+                          or entry["listed"] - mtime_ns < RACY_MTIME_NS or "names" not in entry)
+            if not cached:
+                entry = self._list_dir(dirpath, mtime_ns)
+                if entry is None:
+                    continue
+            yield dirpath, entry, cached
+            stack.extend(os.path.join(dirpath, name) for name in reversed(entry["subdirs"]))
+
+    def directories(self, root):
+        """Return the cached directories at or below root"""
+        self.loaded.wait()
+        root = os.path.abspath(os.path.expanduser(root))
+        prefix = os.path.join(root, "")
+        with self.lock:
+            return [key for key in self.dirs if key == root or key.startswith(prefix)]
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Quick estimate of how much space cleaning would free
+
+Instead of building a result row per file, the estimate sums the space
+actually allocated to each file (st_blocks) while walking with
+os.scandir().
+
+A huge tree is split into subtrees, which are scanned in random order
+until a time limit. If time runs out, the total is extrapolated from the
+subtrees that were scanned, with a 95% bound from their spread. The
+subtree being scanned when time ran out is counted as far as it got.
+"""
+
+# standard library imports
+import collections
+import math
+import os
+import random
+import time
+
+# st_blocks is always counted in 512-byte units.
+BLOCK_SIZE = 512
+
+# Split the tree until there are at least this many subtrees to sample.
+# Directory sizes are heavy-tailed, so a small sample badly misjudges them.
+MIN_SUBTREES = 256
+
+# Do not descend more than this many levels looking for subtrees.
+MAX_SPLIT_DEPTH = 4
+
+Estimate = collections.namedtuple("Estimate", "bytes files bound exact")
+Estimate.__doc__ = """Estimated bytes and file count, with a 95% bound on bytes"""
+
+
+def _file_usage(entry):
+    """Return the bytes allocated to a file from a DirEntry"""
+    st = entry.stat(follow_symlinks=False)
+    blocks = getattr(st, "st_blocks", None)
+    if blocks is None:
+        # Windows does not report blocks.
+        return st.st_size
+    return blocks * BLOCK_SIZE
+
+
+def _scan_level(dirpath, pattern, exclude):
+    """Return (bytes, files, subdirectories) for the files directly in one directory"""
+    total_bytes = 0
+    total_files = 0
+    subdirs = []
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in exclude:
+                            subdirs.append(entry.path)
+                    elif pattern is None or pattern.match(entry.path):
+                        total_bytes += _file_usage(entry)
+                        total_files += 1
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return total_bytes, total_files, subdirs
+
+
+def _scan_tree(dirpath, pattern, exclude, deadline):
+    """Return (bytes, files, complete) below a directory
+
+    complete is False if the deadline passed, and then the totals cover only
+    the directories scanned so far.
+    """
+    total_bytes = 0
+    total_files = 0
+    stack = [dirpath]
+    while stack:
+        if time.monotonic() > deadline:
+            return total_bytes, total_files, False
+        level_bytes, level_files, subdirs = _scan_level(stack.pop(), pattern, exclude)
+        total_bytes += level_bytes
+        total_files += level_files
+        stack.extend(subdirs)
+    return total_bytes, total_files, True
+
+
+def estimate(root, pattern=None, exclude=(), time_limit=1.0, rng=random):
+    """Estimate the space used by files below root
+
+    pattern is None to count every file, or a compiled regular expression
+    matched against each full path. Directories in exclude are skipped.
+    The result is exact if the whole tree was scanned within time_limit
+    seconds.
+    """
+    deadline = time.monotonic() + time_limit
+    exclude = frozenset(exclude)
+    exact_bytes = 0
+    exact_files = 0
+    subtrees = [root]
+    # Count the top levels exactly while splitting into subtrees.
+    for _depth in range(MAX_SPLIT_DEPTH):
+        if len(subtrees) >= MIN_SUBTREES or not subtrees:
+            break
+        next_subtrees = []
+        for dirpath in subtrees:
+            if time.monotonic() > deadline:
+                # Leave the rest unsplit; they are still disjoint subtrees.
+                next_subtrees.append(dirpath)
+                continue
+            level_bytes, level_files, subdirs = _scan_level(dirpath, pattern, exclude)
+            exact_bytes += level_bytes
+            exact_files += level_files
+            next_subtrees.extend(subdirs)
+        subtrees = next_subtrees
+    rng.shuffle(subtrees)
+    sample_bytes = []
+    sample_files = []
+    n_total = len(subtrees)
+    complete = True
+    for dirpath in subtrees:
+        tree_bytes, tree_files, complete = _scan_tree(dirpath, pattern, exclude, deadline)
+        if not complete:
+            # Count what was scanned of the interrupted subtree, and
+            # extrapolate only over the subtrees not started.
+            exact_bytes += tree_bytes
+            exact_files += tree_files
+            n_total -= 1
+            break
+        sample_bytes.append(tree_bytes)
+        sample_files.append(tree_files)
+    n_sampled = len(sample_bytes)
+    if n_sampled == n_total and complete:
+        return Estimate(exact_bytes + sum(sample_bytes), exact_files + sum(sample_files), 0, True)
+    if n_sampled == n_total or n_sampled < 2:
+        # Too few subtrees to extrapolate: report what was counted as a lower bound.
+        return Estimate(exact_bytes + sum(sample_bytes), exact_files + sum(sample_files), None, False)
+    # Extrapolate from the sampled subtrees, with the finite population correction.
+    mean_bytes = sum(sample_bytes) / n_sampled
+    variance = sum((b - mean_bytes) ** 2 for b in sample_bytes) / (n_sampled - 1)
+    standard_error = n_total * math.sqrt(variance / n_sampled * (1 - n_sampled / n_total))
+    total_files = exact_files + n_total * sum(sample_files) / n_sampled
+    return Estimate(int(exact_bytes + n_total * mean_bytes), int(total_files),
+                    int(1.96 * standard_error), False)
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Files and directories that are always skipped
+
+The skip list is saved as JSON in the BleachBit configuration directory.
+Files and directories are added in batches, so skipping a million files
+is one write.
+"""
+
+# standard library imports
+import json
+import os
+import threading
+
+
+def default_skip_list_path():
+    """Return the path of the skip list file"""
+    return os.path.expanduser("~/.config/bleachbit/skip_list.json")
+
+
+class SkipList:
+    """Sets of skipped file paths and directory paths"""
+
+    def __init__(self, path=None):
+        self.path = path or default_skip_list_path()
+        self.files = set()
+        self.directories = set()
+        # Lets a background thread save while the GUI adds entries.
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the skip list, ignoring a missing or damaged file"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.files = set(data.get("files", []))
+        self.directories = set(data.get("directories", []))
+
+    def save(self):
+        """Write the skip list to disk"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self.lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                # Sorting a million paths would cost more than writing them.
+                json.dump({"files": list(self.files), "directories": list(self.directories)}, f,
+                          separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+
+    def update(self, files=(), directories=()):
+        """Add files and directories without saving"""
+        with self.lock:
+            self.files.update(files)
+            self.directories.update(directories)
+
+    def add(self, files=(), directories=()):
+        """Add files and directories and save once"""
+        self.update(files, directories)
+        self.save()
+
+    def contains(self, path):
+        """Return True if a file or one of its parent directories is skipped"""
+        return path in self.files or self.skips_directory(os.path.dirname(path))
+
+    def skips_directory(self, dirpath):
+        """Return True if a directory or one of its parents is skipped"""
+        if not self.directories:
+            return False
+        parent = dirpath
+        while True:
+            if parent in self.directories:
+                return True
+            next_parent = os.path.dirname(parent)
+            if next_parent == parent:
+                return False
+            parent = next_parent
@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+# vim: ts=4:sw=4:expandtab
+
+# BleachBit
+# Copyright (C) 2008-2024 Andrew Ziem
+# https://www.bleachbit.org
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Low-impact mode for cleaning on busy systems
+
+The cleaning thread lowers its own I/O and CPU priority, and each file
+waits for tokens before it is deleted: one token per unlink, and one per
+byte shredded. When the system is under I/O pressure (from
+/proc/pressure/io) or heavy load, the rates back off until it recovers.
+
+Priorities are set per thread: the idle I/O class and nice 19. SCHED_IDLE
+is not used, because the cleaning thread shares the GIL with the GTK main
+loop, and an idle-class thread descheduled while holding the GIL would
+freeze the window on a busy system. Anything the system does not support
+is skipped.
+"""
+
+# standard library imports
+import collections
+import ctypes
+import ctypes.util
+import os
+import platform
+import sys
+import threading
+import time
+
+# ioprio_set() has no libc wrapper, so it is called by syscall number.
+SYS_IOPRIO_SET = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "riscv64": 30,
+                  "armv7l": 314, "ppc64le": 273}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# Back off when the share of time some task waited on I/O over the last
+# 10 seconds exceeds this percentage.
+PRESSURE_HIGH = 10.0
+
+# Back off when the 1-minute load average per CPU exceeds this.
+LOAD_HIGH = 1.0
+
+# Each back-off halves the rates, down to this fraction.
+MIN_RATE_FACTOR = 1 / 16
+
+# Check the system load at most this often, in seconds.
+CHECK_INTERVAL = 1.0
+
+# The effective rate is measured over this many seconds.
+RATE_WINDOW = 5.0
+
+PRESSURE_PATH = "/proc/pressure/io"
+
+
+def set_idle_priority():
+    """Give the calling thread idle I/O priority and the lowest CPU priority
+
+    Returns a list of the priorities that were set.
+    """
+    applied = []
+    syscall_number = SYS_IOPRIO_SET.get(platform.machine())
+    if sys.platform.startswith("linux") and syscall_number is not None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            # Who 0 is the calling thread.
+            if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0:
+                applied.append("idle I/O")
+        except OSError:
+            pass
+    if hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            applied.append("nice 19")
+        except OSError:
+            pass
+    return applied
+
+
+def io_pressure():
+    """Return the percentage of time some task waited on I/O over 10 seconds, or None"""
+    try:
+        with open(PRESSURE_PATH, encoding="ascii") as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == "some":
+                    return float(dict(field.split("=") for field in fields[1:])["avg10"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def load_per_cpu():
+    """Return the 1-minute load average divided by the number of CPUs, or None"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return None
+
+
+class TokenBucket:
+    """Rate limiter that lets a burst through and then averages out to the rate
+
+    A request larger than the burst is allowed and leaves the bucket in
+    debt, so a single large file is not split up.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def consume(self, amount, abort_event):
+        """Take tokens, waiting while the bucket is in debt
+
+        Returns False if abort_event was set while waiting.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= amount
+        if self.tokens < 0:
+            return not abort_event.wait(-self.tokens / self.rate)
+        return True
+
+
+class Throttle:
+    """Limits on bytes shredded and files deleted per second, with back-off
+
+    Call wait() from the cleaning thread before each file.
+    """
+
+    def __init__(self, bytes_per_second, unlinks_per_second):
+        self.bytes_per_second = bytes_per_second
+        self.unlinks_per_second = unlinks_per_second
+        self.byte_bucket = TokenBucket(bytes_per_second, bytes_per_second)
+        self.unlink_bucket = TokenBucket(unlinks_per_second, unlinks_per_second)
+        self.factor = 1.0
+        self.reason = ""
+        self.next_check = 0.0
+        self.history = collections.deque()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def check_system(self):
+        """Halve the rates while the system is busy, and double them again once it is not"""
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + CHECK_INTERVAL
+        pressure = io_pressure()
+        load = load_per_cpu()
+        if pressure is not None and pressure > PRESSURE_HIGH:
+            self.reason = f"I/O pressure {pressure:.0f}%"
+        elif load is not None and load > LOAD_HIGH:
+            self.reason = f"load {load:.1f} per CPU"
+        else:
+            self.reason = ""
+        if self.reason:
+            self.factor = max(MIN_RATE_FACTOR, self.factor / 2)
+        else:
+            self.factor = min(1.0, self.factor * 2)
+        self.byte_bucket.rate = self.bytes_per_second * self.factor
+        self.unlink_bucket.rate = self.unlinks_per_second * self.factor
+
+    def wait(self, shred_bytes, abort_event):
+        """Wait until one file, with shred_bytes to overwrite, may be cleaned
+
+        Returns False if abort_event was set while waiting.
+        """
+        self.check_system()
+        if not self.unlink_bucket.consume(1, abort_event):
+            return False
+        if shred_bytes and not self.byte_bucket.consume(shred_bytes, abort_event):
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.history.append((now, shred_bytes))
+            while self.history and self.history[0][0] < now - RATE_WINDOW:
+                self.history.popleft()
+        return True
+
+    def effective_rate(self):
+        """Return (bytes per second, files per second) over the last few seconds"""
+        now = time.monotonic()
+        with self.lock:
+            recent = [shred_bytes for timestamp, shred_bytes in self.history if timestamp >= now - RATE_WINDOW]
+        window = min(RATE_WINDOW, max(now - self.started, 1e-3))
+        return sum(recent) / window, len(recent) / window